@@ -0,0 +1,148 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+STATUS_INDEX = {"pending": 0, "completed": 1, "cancelled": 2}
+
+def analytics_delta(user_id: int, task_date: str, status: str, previous_status: Optional[str] = None,
+                    completed_at: Optional[str] = None, reason: Optional[str] = None, count: int = 1) -> Dict:
+    """Variação dos agregados causada por uma escrita, nos parâmetros da função apply_analytics_delta do banco"""
+    return {
+        "p_user_id": user_id,
+        "p_task_date": str(task_date)[:10],
+        "p_status": status,
+        "p_previous_status": previous_status,
+        # "2024-05-01T14:32:10+00:00": a hora é lida no fuso gravado, como no pandas
+        "p_hour": int(str(completed_at)[11:13]) if completed_at else None,
+        "p_reason": reason,
+        "p_count": count,
+    }
+
+class UserAnalyticsState:
+    """Agregados compactos de um usuário, separados por dia da tarefa"""
+    
+    def __init__(self, user_id: int, days: Optional[Dict[str, Dict]] = None, window_days: int = 30):
+        self.user_id = user_id
+        self.window_days = window_days
+        # {"2024-05-01": {"status": [p, c, x], "hours": [24 bins], "reasons": {motivo: n}}}
+        self.days = days or {}
+    
+    def _bucket(self, task_date: str) -> Dict:
+        bucket = self.days.get(task_date)
+        if bucket is None:
+            bucket = {"status": [0, 0, 0], "hours": [0] * 24, "reasons": {}}
+            self.days[task_date] = bucket
+        return bucket
+    
+    def add_chunk(self, chunk: Dict[str, list]):
+        """Soma um lote colunar de tarefas (iter_task_chunks) aos agregados, de forma vetorizada"""
+        if not chunk.get("task_date"):
+            return
+        # Importado aqui: o bot e o agendador usam o estado sem precisar carregar o numpy
+        import numpy as np
+        days = np.array([str(d)[:10] for d in chunk["task_date"]], dtype="datetime64[D]").astype(np.int64)
+        codes = np.array([STATUS_INDEX.get(status, -1) for status in chunk["status"]])
+        valid = codes >= 0
+        first_day = int(days.min())
+        offsets = days - first_day
+        n_days = int(offsets.max()) + 1
+        
+        status_counts = np.bincount(offsets[valid] * 3 + codes[valid], minlength=n_days * 3).reshape(n_days, 3)
+        
+        completed = [
+            (offset, int(str(completed_at)[11:13]))
+            for offset, code, completed_at in zip(offsets, codes, chunk.get("completed_at") or [None] * len(codes))
+            if code == STATUS_INDEX["completed"] and completed_at
+        ]
+        hour_counts = np.zeros((n_days, 24), dtype=np.int64)
+        if completed:
+            completed = np.array(completed)
+            hour_counts = np.bincount(completed[:, 0] * 24 + completed[:, 1], minlength=n_days * 24).reshape(n_days, 24)
+        
+        for offset in np.flatnonzero(status_counts.sum(axis=1)):
+            bucket = self._bucket(str(np.datetime64(first_day + int(offset), "D")))
+            bucket["status"] = [a + int(b) for a, b in zip(bucket["status"], status_counts[offset])]
+            bucket["hours"] = [a + int(b) for a, b in zip(bucket["hours"], hour_counts[offset])]
+        
+        reasons = chunk.get("cancellation_reason") or [None] * len(codes)
+        for offset, code, reason in zip(offsets, codes, reasons):
+            if code == STATUS_INDEX["cancelled"] and reason:
+                bucket = self._bucket(str(np.datetime64(first_day + int(offset), "D")))
+                bucket["reasons"][reason] = bucket["reasons"].get(reason, 0) + 1
+    
+    def apply_delta(self, delta: Dict):
+        """Aplica uma variação de analytics_delta, com a mesma regra da função apply_analytics_delta do banco"""
+        bucket = self._bucket(delta["p_task_date"])
+        count = delta.get("p_count", 1)
+        status = bucket["status"]
+        previous = STATUS_INDEX.get(delta.get("p_previous_status"))
+        if previous is not None:
+            status[previous] = max(status[previous] - count, 0)
+        status[STATUS_INDEX[delta["p_status"]]] += count
+        if delta.get("p_hour") is not None:
+            bucket["hours"][delta["p_hour"]] += count
+        if delta.get("p_reason"):
+            bucket["reasons"][delta["p_reason"]] = bucket["reasons"].get(delta["p_reason"], 0) + count
+    
+    def expire(self, today: Optional[date] = None):
+        """Descarta os dias que saíram da janela"""
+        today = today or date.today()
+        cutoff = (today - timedelta(days=self.window_days)).isoformat()
+        for task_date in [d for d in self.days if d < cutoff]:
+            del self.days[task_date]
+    
+    def window_buckets(self, days_back: int, today: Optional[date] = None) -> Dict[str, Dict]:
+        """Dias com data de tarefa dentro da janela pedida"""
+        today = today or date.today()
+        start = (today - timedelta(days=days_back)).isoformat()
+        return {d: bucket for d, bucket in self.days.items() if d >= start}
+    
+    def hourly_counts(self, days_back: int = 30) -> List[int]:
+        """Histograma de 24 posições com as conclusões por hora"""
+        totals = [0] * 24
+        for bucket in self.window_buckets(days_back).values():
+            for hour, count in enumerate(bucket["hours"]):
+                totals[hour] += count
+        return totals
+    
+    def status_counts(self, days_back: int = 30) -> List[int]:
+        """Quantidade de tarefas em cada status (pendente, concluída, cancelada) na janela"""
+        totals = [0, 0, 0]
+        for bucket in self.window_buckets(days_back).values():
+            for i, count in enumerate(bucket["status"]):
+                totals[i] += count
+        return totals
+    
+    def active_days(self, days_back: int = 30) -> int:
+        """Dias da janela com alguma tarefa"""
+        return sum(1 for bucket in self.window_buckets(days_back).values() if any(bucket["status"]))
+    
+    def weekday_status_counts(self, days_back: int = 30) -> List[List[int]]:
+        """Matriz 7×3 de dia da semana por status"""
+        totals = [[0, 0, 0] for _ in range(7)]
+        for task_date, bucket in self.window_buckets(days_back).items():
+            row = totals[date.fromisoformat(task_date).weekday()]
+            for i, count in enumerate(bucket["status"]):
+                row[i] += count
+        return totals
+    
+    def reason_counts(self, days_back: int = 30) -> Dict[str, int]:
+        """Contagem de motivos de cancelamento na janela"""
+        totals = {}
+        for bucket in self.window_buckets(days_back).values():
+            for reason, count in bucket["reasons"].items():
+                totals[reason] = totals.get(reason, 0) + count
+        return totals
+    
+    def to_dict(self) -> Dict:
+        return {"user_id": self.user_id, "days": self.days}
+    
+    @classmethod
+    def from_dict(cls, data: Dict, window_days: int = 30) -> "UserAnalyticsState":
+        return cls(data["user_id"], data.get("days") or {}, window_days)
+    
+    @classmethod
+    def from_row(cls, row: Dict, window_days: int = 30) -> "UserAnalyticsState":
+        """Estado lido de user_analytics_state, já sem os dias que saíram da janela"""
+        state = cls.from_dict(row, window_days)
+        state.expire()
+        return state
@@ -1,24 +1,70 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, timedelta, date
-from database import TaskDatabase
+from async_database import EventLoopThread, gather
+from metrics import metrics, start_trace
+from storage import create_async_database, get_database
 from productivity_analyzer import ProductivityAnalyzer
-from llm_processor import TaskProcessor
+from task_metrics import TASK_STATUSES, TaskTables
 
 st.set_page_config(page_title="Dashboard de Tarefas", layout="wide", page_icon="📊")
 
-db = TaskDatabase()
-analyzer = ProductivityAnalyzer()
-processor = TaskProcessor()
+DAY_NAMES = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+# A partir deste período os gráficos somam daily_task_rollups em vez de agregar as tarefas
+ROLLUP_MIN_DAYS = 90
+
+@st.cache_resource
+def get_services():
+    """Instâncias compartilhadas entre reruns, para que o cache de leituras sobreviva"""
+    db = get_database()
+    # O cliente assíncrono divide o cache com o síncrono, então as gravações o invalidam
+    async_db = create_async_database(db)
+    return db, async_db, EventLoopThread(), ProductivityAnalyzer(db=db)
+
+@st.cache_resource
+def get_processor():
+    """Cliente do Gemini criado só quando alguém pede sugestões, e depois compartilhado entre sessões"""
+    from llm_processor import TaskProcessor
+    return TaskProcessor()
+
+db, async_db, event_loop, analyzer = get_services()
 
 # Input do User ID
 st.sidebar.title("⚙️ Configurações")
 USER_ID = st.sidebar.number_input("Seu Telegram User ID", min_value=1, value=123456789, help="Digite seu ID do Telegram")
+DEBUG = st.sidebar.checkbox("🐞 Painel de depuração", help="Mostra o tempo de cada consulta e chamada ao Gemini deste carregamento")
+
+# Cada rerun começa um trace novo com as operações de banco, LLM e análise
+trace_spans = start_trace()
 
 st.title("📊 Dashboard de Produtividade Inteligente")
 
+# Filtros de data
+col1, col2 = st.columns(2)
+with col1:
+    start_date = st.date_input("Data inicial", date.today() - timedelta(days=30))
+with col2:
+    end_date = st.date_input("Data final", date.today())
+
+# Períodos longos leem uma linha pré-agregada por dia, atualizada pelo rollup_refresher.py
+use_rollups = (end_date - start_date).days >= ROLLUP_MIN_DAYS
+get_aggregates = async_db.get_rollup_aggregates if use_rollups else async_db.get_dashboard_aggregates
+
+# Leituras independentes em paralelo: a página espera só pela mais lenta
+try:
+    page_data = event_loop.run(gather(
+        analytics=async_db.get_latest_analytics(USER_ID),
+        settings=async_db.get_user_notification_settings(USER_ID),
+        aggregates=get_aggregates(USER_ID, start_date, end_date),
+        recent_tasks=async_db.get_recent_tasks(USER_ID, start_date, end_date, limit=20)
+    ))
+except Exception as e:
+    st.error(f"❌ Erro ao carregar dados: {e}")
+    st.info("Verifique se as credenciais do Supabase estão corretas nos Secrets.")
+    st.stop()
+
 # Sidebar com análises
 with st.sidebar:
     st.header("🧠 Insights Inteligentes")
@@ -32,7 +78,7 @@ with st.sidebar:
             except Exception as e:
                 st.error(f"Erro na análise: {e}")
     
-    analytics = db.get_latest_analytics(USER_ID)
+    analytics = page_data['analytics']
     
     if analytics:
         st.subheader("⏰ Seus Melhores Horários")
@@ -40,58 +86,55 @@ with st.sidebar:
         st.metric("Hora Menos Produtiva", f"{analytics['worst_completion_hour']}:00h")
         
         st.subheader("📅 Melhores Dias")
-        days = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
-        st.metric("Melhor Dia", days[analytics['best_day_of_week']])
-        st.metric("Pior Dia", days[analytics['worst_day_of_week']])
+        st.metric("Melhor Dia", DAY_NAMES[analytics['best_day_of_week']])
+        st.metric("Pior Dia", DAY_NAMES[analytics['worst_day_of_week']])
         
         st.subheader("📈 Performance")
         st.metric("Score de Produtividade", f"{analytics['productivity_score']:.1f}/100")
         
         st.subheader("⏰ Notificação Ajustada")
-        settings = db.get_user_notification_settings(USER_ID)
+        settings = page_data['settings']
         if settings:
             st.info(f"🔔 Lembrete: {settings['reminder_notification_time']}")
         
         st.subheader("💡 Sugestões Personalizadas")
         if st.button("Gerar Sugestões com IA"):
-            with st.spinner("Gemini analisando..."):
-                try:
-                    suggestions = processor.suggest_task_optimization(analytics)
-                    st.markdown(suggestions)
-                except Exception as e:
-                    st.error(f"Erro: {e}")
+            try:
+                # O texto aparece conforme o Gemini gera, sem esperar a resposta inteira
+                st.write_stream(get_processor().stream_suggestions(analytics))
+            except Exception as e:
+                st.error(f"Erro: {e}")
     else:
         st.info("👆 Clique em 'Atualizar Análise' para começar")
-
-# Filtros de data
-col1, col2 = st.columns(2)
-with col1:
-    start_date = st.date_input("Data inicial", date.today() - timedelta(days=30))
-with col2:
-    end_date = st.date_input("Data final", date.today())
+    
+    cache_stats = db.cache_stats()
+    st.caption(f"🗄️ Cache: {cache_stats['hits']} acertos / {cache_stats['misses']} faltas")
+    if use_rollups:
+        st.caption("📦 Período longo: contagens pré-agregadas por dia, atualizadas a cada poucos minutos")
 
 # Buscar dados
 try:
-    tasks = db.get_tasks_for_dashboard(USER_ID, start_date, end_date)
-    df = pd.DataFrame(tasks)
+    # Os gráficos usam só contagens agregadas no servidor
+    aggregates = page_data['aggregates']
+    tables = TaskTables.from_aggregates(aggregates)
 
-    if not df.empty:
-        df['task_date'] = pd.to_datetime(df['task_date'])
-        df['completed_at'] = pd.to_datetime(df['completed_at'])
+    if tables.total > 0:
+        # O plotly só é carregado quando há gráficos para desenhar
+        import plotly.express as px
         
         # Métricas principais
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_tasks = len(df)
+            total_tasks = tables.total
             st.metric("Total de Tarefas", total_tasks)
         
         with col2:
-            completed = len(df[df['status'] == 'completed'])
+            completed = int(tables.status_counts[1])
             st.metric("Concluídas", completed, delta=f"{completed}/{total_tasks}")
         
         with col3:
-            pending = len(df[df['status'] == 'pending'])
+            pending = int(tables.status_counts[0])
             st.metric("Pendentes", pending)
         
         with col4:
@@ -101,7 +144,8 @@ try:
         
         # Gráfico de tarefas por status
         st.subheader("📈 Distribuição de Tarefas")
-        status_counts = df['status'].value_counts()
+        status_counts = pd.Series(tables.status_counts, index=TASK_STATUSES)
+        status_counts = status_counts[status_counts > 0]
         fig_status = px.pie(values=status_counts.values, names=status_counts.index, 
                             title="Status das Tarefas",
                             color_discrete_map={'completed': '#00d26a', 'pending': '#ffa600', 'cancelled': '#ff4444'})
@@ -109,10 +153,9 @@ try:
         
         # Análise de produtividade por hora do dia
         st.subheader("⏰ Produtividade por Hora do Dia")
-        completed_df = df[df['status'] == 'completed'].copy()
-        if not completed_df.empty:
-            completed_df['hour'] = completed_df['completed_at'].dt.hour
-            hourly_completion = completed_df.groupby('hour').size().reset_index(name='count')
+        if tables.hourly_completed.any():
+            hourly_completion = pd.DataFrame({'hour': range(24), 'count': tables.hourly_completed})
+            hourly_completion = hourly_completion[hourly_completion['count'] > 0]
             
             fig_hourly = px.bar(hourly_completion, x='hour', y='count',
                                title="Tarefas Concluídas por Hora",
@@ -123,10 +166,12 @@ try:
         
         # Análise por dia da semana
         st.subheader("📅 Produtividade por Dia da Semana")
-        df['day_of_week'] = df['task_date'].dt.dayofweek
-        df['day_name'] = df['task_date'].dt.day_name()
-        
-        daily_stats = df.groupby(['day_name', 'status']).size().reset_index(name='count')
+        daily_stats = pd.DataFrame({
+            'day_name': np.repeat(DAY_NAMES, 3),
+            'status': np.tile(TASK_STATUSES, 7),
+            'count': tables.weekday_status.ravel()
+        })
+        daily_stats = daily_stats[daily_stats['count'] > 0]
         fig_weekly = px.bar(daily_stats, x='day_name', y='count', color='status',
                            title="Tarefas por Dia da Semana",
                            color_discrete_map={'completed': '#00d26a', 'pending': '#ffa600', 'cancelled': '#ff4444'})
@@ -134,7 +179,12 @@ try:
         
         # Gráfico de tarefas ao longo do tempo
         st.subheader("📅 Evolução Temporal")
-        daily_tasks = df.groupby(['task_date', 'status']).size().reset_index(name='count')
+        daily_tasks = pd.DataFrame({
+            'task_date': np.repeat(tables.dates, 3),
+            'status': np.tile(TASK_STATUSES, len(tables.dates)),
+            'count': tables.daily_status.ravel()
+        })
+        daily_tasks = daily_tasks[daily_tasks['count'] > 0]
         fig_timeline = px.line(daily_tasks, x='task_date', y='count', color='status',
                               title="Tarefas ao Longo do Tempo",
                               color_discrete_map={'completed': '#00d26a', 'pending': '#ffa600', 'cancelled': '#ff4444'})
@@ -142,9 +192,8 @@ try:
         
         # Análise de motivos de cancelamento
         st.subheader("❌ Principais Motivos de Cancelamento")
-        cancelled_df = df[df['status'] == 'cancelled']
-        if not cancelled_df.empty and 'cancellation_reason' in cancelled_df.columns:
-            reasons = cancelled_df['cancellation_reason'].value_counts().head(5)
+        if aggregates['reasons']:
+            reasons = pd.Series({row['reason']: row['count'] for row in aggregates['reasons']})
             if not reasons.empty:
                 fig_reasons = px.bar(x=reasons.values, y=reasons.index, orientation='h',
                                     title="Top 5 Motivos de Cancelamento",
@@ -154,7 +203,7 @@ try:
         
         # Tabela de tarefas recentes
         st.subheader("📋 Tarefas Recentes")
-        display_df = df[['task_date', 'task_description', 'status', 'cancellation_reason']].sort_values('task_date', ascending=False).head(20)
+        display_df = pd.DataFrame(page_data['recent_tasks'], columns=['task_date', 'task_description', 'status', 'cancellation_reason'])
         st.dataframe(display_df, use_container_width=True)
         
     else:
@@ -164,3 +213,21 @@ try:
 except Exception as e:
     st.error(f"❌ Erro ao carregar dados: {e}")
     st.info("Verifique se as credenciais do Supabase estão corretas nos Secrets.")
+
+if DEBUG:
+    with st.expander("🐞 Depuração", expanded=True):
+        st.subheader("Operações deste carregamento")
+        if trace_spans:
+            first = min(span['started_at'] for span in trace_spans)
+            trace_df = pd.DataFrame(trace_spans)
+            trace_df['start_ms'] = ((trace_df['started_at'] - first) * 1000).round(2)
+            st.dataframe(
+                trace_df[['start_ms', 'component', 'operation', 'ms', 'rows', 'bytes', 'cache', 'error']].sort_values('start_ms'),
+                use_container_width=True
+            )
+        else:
+            st.caption("Nenhuma operação medida neste carregamento.")
+        
+        st.subheader("Acumulado do processo")
+        st.dataframe(pd.DataFrame(metrics.snapshot()), use_container_width=True)
+        st.download_button("⬇️ Métricas (Prometheus)", metrics.to_prometheus(), file_name="metrics.txt", mime="text/plain")
@@ -0,0 +1,290 @@
+import asyncio
+import inspect
+import threading
+from datetime import date, time
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional
+
+import httpx
+
+from config import SUPABASE_URL, SUPABASE_KEY
+from analytics_state import UserAnalyticsState
+from cache import TTLCache
+from metrics import carry_trace, current_trace, httpx_event_hooks, instrument_class
+from database import (
+    ANALYTICS_COLUMNS, NOTIFICATION_COLUMNS, PENDING_TASK_COLUMNS, RECENT_TASK_COLUMNS, ROLLUP_COLUMNS, TASK_READS,
+    CachedReads, cached_read, rollups_to_aggregates
+)
+from db_queries import (
+    Query, analytics_window_start, batched, behavior_analytics_rows, cancellation_changes, chunk_columns,
+    completion_changes, dashboard_aggregates_params, dashboard_tasks_query, empty_aggregates, group_by_user, init_analytics_state_params, latest_analytics_query,
+    new_task_rows, notification_settings_page_query, notification_settings_rows, pending_bulk_query, pending_tasks_query,
+    recent_tasks_query, rollup_refresh_params, rollups_query, task_chunk_query, to_chunk, user_row_query
+)
+
+async def gather(**calls: Awaitable) -> Dict[str, Any]:
+    """Executa leituras independentes em paralelo e devolve os resultados por nome"""
+    results = await asyncio.gather(*calls.values())
+    return dict(zip(calls.keys(), results))
+
+class EventLoopThread:
+    """Event loop dedicado numa thread, para que o pool de conexões sobreviva entre reruns"""
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+    
+    def run(self, coroutine: Awaitable) -> Any:
+        """Executa a corrotina no loop dedicado e espera o resultado"""
+        # O trace da thread chamadora (ex.: rerun do Streamlit) acompanha a corrotina
+        return asyncio.run_coroutine_threadsafe(carry_trace(coroutine, current_trace()), self.loop).result()
+
+@instrument_class("db")
+class AsyncTaskDatabase(CachedReads):
+    """Variante assíncrona do TaskDatabase sobre a API REST do Supabase com conexões keep-alive.
+    
+    As consultas, linhas gravadas e chaves de cache são as mesmas do TaskDatabase (db_queries, cached_read);
+    aqui fica só o transporte em httpx.
+    """
+    
+    def __init__(self, cache: Optional[TTLCache] = None, max_connections: int = 20, timeout: float = 10.0):
+        self.cache = cache or TTLCache()
+        self.http = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            event_hooks=httpx_event_hooks(is_async=True)
+        )
+    
+    async def aclose(self):
+        await self.http.aclose()
+    
+    async def _fetch(self, query: Query) -> List[Dict]:
+        response = await self.http.get(f"/{query.table}", params=query.params())
+        response.raise_for_status()
+        return response.json()
+    
+    async def _count(self, query: Query) -> int:
+        # HEAD com count=exact: o total vem no Content-Range ("*/12"), sem corpo
+        response = await self.http.head(f"/{query.table}", params=query.params(), headers={"Prefer": "count=exact"})
+        response.raise_for_status()
+        return int(response.headers.get("content-range", "*/0").rsplit("/", 1)[1])
+    
+    async def _write(self, method: str, table: str, data: Any, params: Optional[Dict[str, str]] = None, prefer: str = "return=representation") -> List[Dict]:
+        response = await self.http.request(method, f"/{table}", params=params, json=data, headers={"Prefer": prefer})
+        response.raise_for_status()
+        return response.json() if response.content else []
+    
+    async def _upsert(self, table: str, data: Any) -> List[Dict]:
+        return await self._write("POST", table, data, prefer="resolution=merge-duplicates,return=representation")
+    
+    async def _rpc(self, function: str, params: Dict) -> Any:
+        response = await self.http.post(f"/rpc/{function}", json=params)
+        response.raise_for_status()
+        return response.json()
+    
+    async def add_task(self, user_id: int, task_description: str, task_date: date) -> Dict:
+        """Adiciona uma nova tarefa"""
+        rows = await self._write("POST", "tasks", new_task_rows(user_id, [task_description], task_date)[0])
+        task = rows[0] if rows else None
+        if task:
+            self._invalidate([user_id], TASK_READS)
+        return task
+    
+    async def add_tasks(self, user_id: int, task_descriptions: List[str], task_date: date) -> List[Dict]:
+        """Adiciona várias tarefas numa única requisição"""
+        if not task_descriptions:
+            return []
+        tasks = await self._write("POST", "tasks", new_task_rows(user_id, task_descriptions, task_date))
+        if tasks:
+            self._invalidate([user_id], TASK_READS)
+        return tasks
+    
+    @cached_read
+    async def get_daily_task_count(self, user_id: int, task_date: date) -> int:
+        """Retorna quantidade de tarefas do dia"""
+        return await self._count(pending_tasks_query(user_id, task_date, "id"))
+    
+    async def _update_task(self, task_id: str, changes: Dict) -> Dict:
+        rows = await self._write("PATCH", "tasks", changes, params={"id": f"eq.{task_id}"})
+        task = rows[0] if rows else None
+        if task:
+            self._invalidate([task["user_id"]], TASK_READS)
+        return task
+    
+    async def complete_task(self, task_id: str) -> Dict:
+        """Marca tarefa como concluída"""
+        return await self._update_task(task_id, completion_changes())
+    
+    async def cancel_task(self, task_id: str, reason: str) -> Dict:
+        """Cancela tarefa com justificativa"""
+        return await self._update_task(task_id, cancellation_changes(reason))
+    
+    @cached_read
+    async def get_pending_tasks(self, user_id: int, task_date: date) -> List[Dict]:
+        """Busca tarefas pendentes do dia"""
+        return await self._fetch(pending_tasks_query(user_id, task_date))
+    
+    @cached_read
+    async def get_tasks_for_dashboard(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Dict]:
+        """Busca tarefas para dashboard"""
+        return await self._fetch(dashboard_tasks_query(user_id, start_date, end_date))
+    
+    @cached_read
+    async def get_dashboard_aggregates(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """Contagens por data/status, por hora de conclusão e principais motivos, agregadas no servidor"""
+        return await self._rpc("dashboard_task_aggregates", dashboard_aggregates_params(user_id, start_date, end_date)) or empty_aggregates()
+    
+    @cached_read
+    async def get_daily_rollups(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None, page_size: int = 1000) -> List[Dict]:
+        """Contagens diárias pré-agregadas do usuário (uma linha por dia com tarefas), em ordem de data"""
+        rows, last = [], None
+        while True:
+            page = await self._fetch(rollups_query(user_id, start_date, end_date, ROLLUP_COLUMNS, page_size, last))
+            if not page:
+                break
+            rows += page
+            last = page[-1]["task_date"]
+        return rows
+    
+    async def get_rollup_aggregates(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """Mesmo formato de get_dashboard_aggregates, somado a partir de daily_task_rollups (para períodos longos)"""
+        return rollups_to_aggregates(await self.get_daily_rollups(user_id, start_date, end_date))
+    
+    async def refresh_daily_rollups(self, completed_since: Optional[str] = None, date_since: Optional[date] = None) -> Dict:
+        """Recalcula os dias com tarefas concluídas desde completed_since ou com task_date >= date_since (sem ambos, tudo)"""
+        return await self._rpc("refresh_daily_task_rollups", rollup_refresh_params(completed_since, date_since))
+    
+    @cached_read
+    async def get_recent_tasks(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 20) -> List[Dict]:
+        """Busca só as colunas e linhas exibidas na tabela de tarefas recentes"""
+        return await self._fetch(recent_tasks_query(user_id, start_date, end_date, RECENT_TASK_COLUMNS, limit))
+    
+    @cached_read
+    async def get_user_notification_settings(self, user_id: int) -> Dict:
+        """Busca configurações de notificação do usuário"""
+        rows = await self._fetch(user_row_query("notification_settings", user_id))
+        return rows[0] if rows else None
+    
+    async def update_notification_settings(self, user_id: int, morning_time: time, reminder_time: time) -> Dict:
+        """Atualiza horários de notificação"""
+        rows = await self._upsert("notification_settings", notification_settings_rows({user_id: (morning_time, reminder_time)})[0])
+        self._invalidate([user_id], ["get_user_notification_settings"])
+        return rows[0] if rows else None
+    
+    async def save_behavior_analytics(self, user_id: int, analytics: Dict) -> Dict:
+        """Salva análise de comportamento do usuário"""
+        rows = await self._upsert("user_behavior_analytics", behavior_analytics_rows({user_id: analytics})[0])
+        self._invalidate([user_id], ["get_latest_analytics"])
+        return rows[0] if rows else None
+    
+    @cached_read
+    async def get_latest_analytics(self, user_id: int) -> Dict:
+        """Busca última análise de comportamento"""
+        rows = await self._fetch(latest_analytics_query(user_id))
+        return rows[0] if rows else None
+    
+    async def iter_task_chunks(self, user_id: Optional[int] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, chunk_size: int = 1000, columns: str = ANALYTICS_COLUMNS) -> AsyncIterator[Dict[str, list]]:
+        """Lê as tarefas em lotes colunares com paginação por chave (task_date, id)"""
+        names = chunk_columns(columns)
+        last = None
+        while True:
+            rows = await self._fetch(task_chunk_query(user_id, start_date, end_date, names, chunk_size, last))
+            if not rows:
+                break
+            yield to_chunk(rows, names)
+            last = rows[-1]
+    
+    async def get_pending_tasks_bulk(self, user_ids: Iterable[int], task_date: date, batch_size: int = 500, page_size: int = 1000) -> Dict[int, List[Dict]]:
+        """Tarefas pendentes do dia de vários usuários, agrupadas por usuário; os lotes de ids são lidos em paralelo"""
+        
+        async def read_batch(batch: List[int]) -> List[Dict]:
+            rows, last = [], None
+            while True:
+                page = await self._fetch(pending_bulk_query(batch, task_date, PENDING_TASK_COLUMNS, page_size, last))
+                if not page:
+                    return rows
+                rows.extend(page)
+                last = page[-1]
+        
+        pages = await asyncio.gather(*(read_batch(batch) for batch in batched(sorted(set(user_ids)), batch_size)))
+        tasks_by_user: Dict[int, List[Dict]] = {}
+        for rows in pages:
+            group_by_user(rows, tasks_by_user)
+        return tasks_by_user
+    
+    async def iter_notification_settings(self, updated_since: Optional[str] = None, page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Percorre em páginas os horários de notificação; com updated_since, só as linhas ajustadas desde então"""
+        last_user = None
+        while True:
+            rows = await self._fetch(notification_settings_page_query(updated_since, NOTIFICATION_COLUMNS, page_size, last_user))
+            if not rows:
+                break
+            yield rows
+            last_user = rows[-1]["user_id"]
+    
+    async def save_behavior_analytics_bulk(self, analytics_by_user: Dict[int, Dict], batch_size: int = 500) -> int:
+        """Salva análises de vários usuários em upserts em lote, enviados em paralelo"""
+        rows = behavior_analytics_rows(analytics_by_user)
+        await asyncio.gather(*(self._upsert("user_behavior_analytics", batch) for batch in batched(rows, batch_size)))
+        self._invalidate(analytics_by_user, ["get_latest_analytics"])
+        return len(rows)
+    
+    async def update_notification_settings_bulk(self, times_by_user: Dict[int, tuple], batch_size: int = 500) -> int:
+        """Atualiza horários de notificação de vários usuários em lote, enviados em paralelo"""
+        rows = notification_settings_rows(times_by_user)
+        await asyncio.gather(*(self._upsert("notification_settings", batch) for batch in batched(rows, batch_size)))
+        self._invalidate(times_by_user, ["get_user_notification_settings"])
+        return len(rows)
+    
+    async def get_analytics_state(self, user_id: int) -> Optional[UserAnalyticsState]:
+        """Busca os agregados incrementais do usuário"""
+        rows = await self._fetch(user_row_query("user_analytics_state", user_id, "user_id,days"))
+        return UserAnalyticsState.from_row(rows[0]) if rows else None
+    
+    async def build_analytics_state(self, user_id: int, days_back: int = 30, chunk_size: int = 1000) -> UserAnalyticsState:
+        """Agrega a janela lendo lotes paginados, sem manter as tarefas brutas em memória"""
+        state = UserAnalyticsState(user_id, window_days=days_back)
+        async for chunk in self.iter_task_chunks(user_id, analytics_window_start(days_back), chunk_size=chunk_size):
+            state.add_chunk(chunk)
+        state.expire()
+        return state
+    
+    async def init_analytics_state(self, user_id: int, days_back: int = 30) -> UserAnalyticsState:
+        """Monta e grava os agregados do usuário no servidor, se ainda não existirem"""
+        days = await self._rpc("init_analytics_state", init_analytics_state_params(user_id, days_back))
+        return UserAnalyticsState.from_row({"user_id": user_id, "days": days}, days_back)
+
+class ThreadedAsyncDatabase:
+    """Expõe um TaskDatabase síncrono (como o SQLite local) com a interface do AsyncTaskDatabase, rodando cada chamada numa thread"""
+    
+    def __init__(self, db):
+        self.db = db
+        self.cache = db.cache
+    
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+        if inspect.isgeneratorfunction(attr):
+            async def iterate(*args, **kwargs):
+                iterator = attr(*args, **kwargs)
+                done = object()
+                while True:
+                    item = await asyncio.to_thread(next, iterator, done)
+                    if item is done:
+                        return
+                    yield item
+            return iterate
+        
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+    
+    async def aclose(self):
+        pass
@@ -0,0 +1,105 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from database import TaskDatabase
+from storage import create_database
+from productivity_analyzer import ProductivityAnalyzer
+
+MORNING_TIME = time(hour=8, minute=0)
+
+def iter_user_batches(db: TaskDatabase, start_date: date, page_size: int, users_per_batch: int) -> Iterator[List[Tuple[int, List[Dict]]]]:
+    """Agrupa as páginas em lotes de usuários com o histórico completo de cada um"""
+    batch = []
+    current_user = None
+    current_rows = []
+    
+    for page in db.iter_task_pages(start_date, page_size=page_size):
+        for row in page:
+            if row["user_id"] != current_user:
+                # As páginas vêm ordenadas por usuário: o anterior está completo
+                if current_user is not None:
+                    batch.append((current_user, current_rows))
+                    if len(batch) >= users_per_batch:
+                        yield batch
+                        batch = []
+                current_user = row["user_id"]
+                current_rows = []
+            current_rows.append(row)
+    
+    if current_user is not None:
+        batch.append((current_user, current_rows))
+    if batch:
+        yield batch
+
+def analyze_user_batch(batch: List[Tuple[int, List[Dict]]], days_back: int = 30) -> Dict[int, Dict]:
+    """Executado nos processos do pool: calcula as métricas de cada usuário do lote na janela de days_back dias"""
+    analyzer = ProductivityAnalyzer()
+    results = {}
+    for user_id, rows in batch:
+        table = analyzer.build_task_table(rows)
+        results[user_id] = analyzer.compute_analytics(user_id, table, days_back)
+    return results
+
+def run_batch(workers: int, page_size: int = 1000, users_per_batch: int = 200, write_batch_size: int = 500, days_back: int = 30) -> int:
+    """Recalcula as análises de todos os usuários ativos e salva em lote"""
+    db = create_database()
+    start_date = date.today() - timedelta(days=days_back)
+    total = 0
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Limita os lotes em voo para não manter todo o histórico em memória
+        in_flight = deque()
+        pending_analytics = {}
+        
+        def drain(limit):
+            nonlocal pending_analytics, total
+            while len(in_flight) > limit:
+                pending_analytics.update(in_flight.popleft().result())
+                if len(pending_analytics) >= write_batch_size:
+                    total += flush_results(db, pending_analytics, write_batch_size)
+                    pending_analytics = {}
+        
+        for batch in iter_user_batches(db, start_date, page_size, users_per_batch):
+            in_flight.append(executor.submit(analyze_user_batch, batch, days_back))
+            drain(workers * 2)
+        drain(0)
+        
+        if pending_analytics:
+            total += flush_results(db, pending_analytics, write_batch_size)
+    
+    return total
+
+def flush_results(db: TaskDatabase, analytics_by_user: Dict[int, Dict], write_batch_size: int) -> int:
+    """Grava análises e horários de notificação como upserts em lote"""
+    db.save_behavior_analytics_bulk(analytics_by_user, batch_size=write_batch_size)
+    times_by_user = {
+        user_id: (MORNING_TIME, time.fromisoformat(analytics["optimal_reminder_time"]))
+        for user_id, analytics in analytics_by_user.items()
+    }
+    db.update_notification_settings_bulk(times_by_user, batch_size=write_batch_size)
+    return len(analytics_by_user)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula as análises de produtividade de todos os usuários")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processos usados nos cálculos com pandas")
+    parser.add_argument("--page-size", type=int, default=1000, help="Linhas por consulta paginada ao banco")
+    parser.add_argument("--users-per-batch", type=int, default=200, help="Usuários enviados por tarefa ao pool")
+    parser.add_argument("--write-batch-size", type=int, default=500, help="Linhas por upsert em lote")
+    parser.add_argument("--days-back", type=int, default=30, help="Janela de dias analisada")
+    args = parser.parse_args()
+    
+    total = run_batch(
+        workers=args.workers,
+        page_size=args.page_size,
+        users_per_batch=args.users_per_batch,
+        write_batch_size=args.write_batch_size,
+        days_back=args.days_back
+    )
+    print(f"✅ Análises atualizadas para {total} usuários")
+
+if __name__ == "__main__":
+    main()
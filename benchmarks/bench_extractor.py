@@ -0,0 +1,111 @@
+"""Benchmark do extrator local de tarefas contra o corpus rotulado (e, opcionalmente, contra o Gemini).
+
+Uso:
+    python benchmarks/bench_extractor.py
+    python benchmarks/bench_extractor.py --threshold 0.9 --verbose
+    python benchmarks/bench_extractor.py --llm
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_extractor import extract_tasks_locally
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_corpus.jsonl")
+
+def load_corpus(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def same_tasks(predicted: list, expected: list) -> bool:
+    """Compara as listas ignorando caixa e espaços nas pontas"""
+    return [task.strip().casefold() for task in predicted] == [task.strip().casefold() for task in expected]
+
+def timed(func, message: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(message)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def report(name: str, hits: int, total: int, timings: list):
+    accuracy = hits / total if total else 0.0
+    print(
+        f"{name:<24} {hits:>3}/{total:<3} corretas ({accuracy:6.1%})  "
+        f"p50 {statistics.median(timings) * 1000:8.3f} ms  p95 {percentile(timings, 0.95) * 1000:8.3f} ms"
+    )
+
+def run_local(corpus: list, threshold: float, repeat: int, verbose: bool) -> dict:
+    timings, accepted, accepted_hits, all_hits = [], 0, 0, 0
+    for case in corpus:
+        (tasks, confidence), seconds = timed(extract_tasks_locally, case["message"], repeat)
+        timings.append(seconds)
+        correct = same_tasks(tasks, case["tasks"])
+        all_hits += correct
+        if confidence >= threshold:
+            accepted += 1
+            accepted_hits += correct
+        if verbose:
+            mark = "✅" if correct else "❌"
+            print(f"{mark} {confidence:.2f} {case['message'][:60]!r} -> {tasks}")
+    
+    report("local (todas)", all_hits, len(corpus), timings)
+    print(f"{'atalho local':<24} {accepted:>3}/{len(corpus):<3} mensagens acima de {threshold} ({accepted / len(corpus):6.1%} de cobertura)")
+    print(f"{'precisão do atalho':<24} {accepted_hits:>3}/{accepted:<3} corretas ({accepted_hits / accepted if accepted else 0:6.1%})")
+    return {"coverage": accepted / len(corpus), "precision": accepted_hits / accepted if accepted else None, "local_seconds": timings}
+
+def run_llm(corpus: list, verbose: bool) -> list:
+    """Mede o caminho do Gemini sem cache e sem atalho local (exige GEMINI_API_KEY)"""
+    from llm_cache import LLMCache
+    from llm_processor import TaskProcessor
+    
+    class NoCache(LLMCache):
+        def get(self, kind, model_name, inputs):
+            return None
+        
+        def set(self, kind, model_name, inputs, value):
+            pass
+    
+    processor = TaskProcessor(cache=NoCache(), local_threshold=float("inf"))
+    timings, hits = [], 0
+    for case in corpus:
+        tasks, seconds = timed(processor.extract_tasks, case["message"], 1)
+        timings.append(seconds)
+        correct = same_tasks(tasks, case["tasks"])
+        hits += correct
+        if verbose:
+            print(f"{'✅' if correct else '❌'} {case['message'][:60]!r} -> {tasks}")
+    report("gemini", hits, len(corpus), timings)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--threshold", type=float, default=0.8, help="Confiança mínima para dispensar o modelo")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--llm", action="store_true", help="Também mede o caminho do Gemini")
+    parser.add_argument("--verbose", action="store_true", help="Mostra o resultado de cada mensagem")
+    parser.add_argument("--output", help="Grava as métricas em JSON")
+    args = parser.parse_args()
+    
+    corpus = load_corpus(args.corpus)
+    results = run_local(corpus, args.threshold, args.repeat, args.verbose)
+    if args.llm:
+        results["llm_seconds"] = run_llm(corpus, args.verbose)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark do tempo de import (partida a frio) de cada módulo, num interpretador novo por medição.
+
+Uso:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --modules database llm_processor --repeat 10 --verbose
+    python benchmarks/bench_import.py --output atual.json
+    python benchmarks/bench_import.py --baseline atual.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Caminho do bot e do agendador, e o que o app.py importa no topo (o app em si roda o script do Streamlit)
+DEFAULT_MODULES = [
+    "config", "database", "storage", "async_database", "llm_processor", "extraction_service",
+    "notification_scheduler", "task_metrics", "productivity_analyzer",
+]
+
+# Dependências pesadas que devem ser carregadas só no primeiro uso
+HEAVY_MODULES = ["pandas", "numpy", "plotly", "google.generativeai", "google.api_core", "supabase", "streamlit"]
+
+PROBE = "import importlib, json, sys; importlib.import_module(sys.argv[1]); print(json.dumps([m for m in sys.argv[2:] if m in sys.modules]))"
+
+def import_profile(module: str):
+    """Importa o módulo num processo novo com -X importtime; devolve (segundos, pesados carregados, linhas do perfil)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, module, *HEAVY_MODULES],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}:\n{result.stderr.strip().splitlines()[-1]}")
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    # Imports de nível zero (sem recuo) somam o tempo total; o resto já está no cumulativo deles
+    seconds = sum(cumulative for name, _, cumulative in profile if not name.startswith("  ")) / 1e6
+    return seconds, json.loads(result.stdout), profile
+
+def top_imports(profile, limit: int):
+    """Pacotes de primeiro nível mais caros, pelo tempo cumulativo"""
+    packages = [(name.strip(), cumulative) for name, _, cumulative in profile if "." not in name.strip()]
+    return sorted(packages, key=lambda item: -item[1])[:limit]
+
+def run(modules, repeat: int, verbose: bool) -> dict:
+    results = {}
+    for module in modules:
+        timings = []
+        for _ in range(repeat):
+            seconds, heavy, profile = import_profile(module)
+            timings.append(seconds)
+        results[module] = min(timings)
+        print(f"{module:<24} {results[module] * 1000:9.1f} ms  pesados: {', '.join(heavy) or '-'}")
+        if verbose:
+            for name, cumulative in top_imports(profile, 5):
+                print(f"    {name:<28} {cumulative / 1000:9.1f} ms")
+    return results
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> int:
+    """Compara com uma execução anterior e retorna 1 se algum import ficou mais lento"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for key, seconds in results.items():
+        reference = baseline.get(key)
+        if reference and seconds > reference * (1 + tolerance):
+            regressions += 1
+            print(f"❌ Regressão em {key}: {reference * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Processos por módulo; vale o menor tempo")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os pacotes mais caros de cada módulo")
+    parser.add_argument("--output", help="Grava os tempos em JSON")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Piora relativa aceita em relação ao baseline")
+    args = parser.parse_args()
+    
+    results = run(args.modules, args.repeat, args.verbose)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        sys.exit(compare(results, args.baseline, args.tolerance))
+
+if __name__ == "__main__":
+    main()
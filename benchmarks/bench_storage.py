@@ -0,0 +1,99 @@
+"""Teste de carga offline com o backend SQLite local (sem rede nem Supabase).
+
+Uso:
+    python benchmarks/bench_storage.py --users 1000 --days 60 --tasks-per-day 5
+    python benchmarks/bench_storage.py --path /tmp/tarefas.sqlite3 --output atual.json
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import TaskDatabase
+from local_database import LocalTaskDatabase
+from productivity_analyzer import ProductivityAnalyzer
+
+REASONS = ["sem tempo", "esqueci", "imprevisto", "cansaço"]
+
+def populate(db: LocalTaskDatabase, users: int, days: int, tasks_per_day: int, seed: int = 42) -> int:
+    """Insere tarefas sintéticas direto no SQLite, numa transação por usuário"""
+    rng = random.Random(seed)
+    today = date.today()
+    total = 0
+    for user_id in range(1, users + 1):
+        rows = []
+        for offset in range(days):
+            task_date = today - timedelta(days=offset)
+            for _ in range(tasks_per_day):
+                status = rng.choices(["pending", "completed", "cancelled"], weights=[30, 55, 15])[0]
+                completed_at = datetime.combine(task_date, datetime.min.time()) + timedelta(seconds=rng.randrange(86_400))
+                rows.append((
+                    str(uuid.uuid4()), user_id, "tarefa", task_date.isoformat(), status,
+                    completed_at.isoformat() if status == "completed" else None,
+                    rng.choice(REASONS) if status == "cancelled" else None,
+                    completed_at.isoformat()
+                ))
+        db._write_many(
+            "insert into tasks (id, user_id, task_description, task_date, status, completed_at, cancellation_reason, created_at) values (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        total += len(rows)
+    return total
+
+def best_time(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run(db: LocalTaskDatabase, users: int, repeat: int) -> dict:
+    analyzer = ProductivityAnalyzer(db=db)
+    today = date.today()
+    user_ids = list(range(1, users + 1))
+    # unwrap tira a instrumentação e o cache de leituras: interessa o tempo da consulta, não de um acerto no cache
+    dashboard_aggregates = inspect.unwrap(type(db).get_dashboard_aggregates)
+    cases = {
+        "dashboard_aggregates": lambda: dashboard_aggregates(db, 1, today - timedelta(days=30), today),
+        "analytics_state_sql": lambda: db.build_analytics_state(1),
+        "analytics_state_paged": lambda: TaskDatabase.build_analytics_state(db, 1),
+        "pending_tasks_bulk": lambda: db.get_pending_tasks_bulk(user_ids, today),
+        "full_analysis": lambda: (db._write("delete from user_analytics_state"), analyzer.run_full_analysis(1)),
+    }
+    results = {}
+    for name, func in cases.items():
+        seconds = best_time(func, repeat)
+        results[name] = seconds
+        print(f"{name:<24} {seconds * 1000:10.2f} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default=":memory:", help="Arquivo SQLite (padrão: em memória)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--tasks-per-day", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Grava os tempos em JSON")
+    args = parser.parse_args()
+    
+    db = LocalTaskDatabase(args.path)
+    start = time.perf_counter()
+    total = populate(db, args.users, args.days, args.tasks_per_day)
+    print(f"{total:,} tarefas inseridas em {time.perf_counter() - start:.1f} s")
+    
+    results = run(db, args.users, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
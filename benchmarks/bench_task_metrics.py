@@ -0,0 +1,107 @@
+"""Benchmark dos caminhos quentes de métricas (task_metrics) com tabelas sintéticas.
+
+Uso:
+    python benchmarks/bench_task_metrics.py --sizes 1000 100000 10000000
+    python benchmarks/bench_task_metrics.py --output atual.json
+    python benchmarks/bench_task_metrics.py --baseline atual.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_metrics import TASK_STATUSES, TaskTables, hourly_completion_counts, weekday_status_counts
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+def synthetic_tasks(n_rows: int, days: int = 365, seed: int = 42) -> pd.DataFrame:
+    """Tabela de tarefas sintética já tipada, como a do ProductivityAnalyzer"""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01', 'D')
+    task_date = start + rng.integers(0, days, n_rows).astype('timedelta64[D]')
+    codes = rng.choice(3, n_rows, p=[0.3, 0.55, 0.15]).astype(np.int8)
+    seconds = rng.integers(0, 86_400, n_rows).astype('timedelta64[s]')
+    completed_at = task_date.astype('datetime64[s]') + seconds
+    completed_at[codes != 1] = np.datetime64('NaT')
+    return pd.DataFrame({
+        'status': pd.Categorical.from_codes(codes, categories=TASK_STATUSES),
+        'task_date': task_date.astype('datetime64[ns]'),
+        'completed_at': completed_at.astype('datetime64[ns]'),
+    })
+
+def legacy_tables(df: pd.DataFrame):
+    """Implementação anterior com groupby, mantida como referência"""
+    completed = df[df['status'] == 'completed']
+    completed.groupby(completed['completed_at'].dt.hour).size()
+    df.groupby(df['task_date'].dt.dayofweek, observed=True).apply(
+        lambda x: (x['status'] == 'completed').sum() / len(x) if len(x) > 0 else 0
+    )
+    df['status'].value_counts()
+    df.groupby([df['task_date'].dt.day_name(), 'status'], observed=True).size()
+    df.groupby(['task_date', 'status'], observed=True).size()
+
+CASES = {
+    "task_tables": lambda df: TaskTables.from_frame(df),
+    "hourly_completion_counts": lambda df: hourly_completion_counts(df),
+    "weekday_status_counts": lambda df: weekday_status_counts(df),
+    "legacy_groupby": legacy_tables,
+}
+
+def best_time(func, df: pd.DataFrame, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run(sizes, repeat: int, include_legacy: bool) -> dict:
+    results = {}
+    for n_rows in sizes:
+        df = synthetic_tasks(n_rows)
+        for name, func in CASES.items():
+            if name == "legacy_groupby" and not include_legacy:
+                continue
+            seconds = best_time(func, df, repeat)
+            results[f"{name}[{n_rows}]"] = seconds
+            print(f"{name:<26} {n_rows:>11,} linhas  {seconds * 1000:10.2f} ms")
+    return results
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> int:
+    """Compara com uma execução anterior e retorna 1 se algum caso ficou mais lento"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for key, seconds in results.items():
+        reference = baseline.get(key)
+        if reference and seconds > reference * (1 + tolerance):
+            regressions += 1
+            print(f"❌ Regressão em {key}: {reference * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-legacy", action="store_true", help="Não mede a implementação com groupby")
+    parser.add_argument("--output", help="Grava os tempos em JSON")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Piora relativa aceita em relação ao baseline")
+    args = parser.parse_args()
+    
+    results = run(args.sizes, args.repeat, include_legacy=not args.no_legacy)
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        sys.exit(compare(results, args.baseline, args.tolerance))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark de memória e tempo de conversão das linhas do banco: TaskTable contra o DataFrame anterior.
+
+Uso:
+    python benchmarks/bench_task_table.py --sizes 1000 10000 100000
+    python benchmarks/bench_task_table.py --output atual.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_metrics import TASK_STATUSES, TaskTables
+from task_table import TaskTable
+
+REASONS = ["sem tempo", "esqueci", "imprevisto", "cansaço"]
+
+def synthetic_rows(n_rows: int, days: int = 365, seed: int = 42):
+    """Linhas como as de get_tasks_for_dashboard (dicts com textos ISO)"""
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for _ in range(n_rows):
+        task_date = today - timedelta(days=rng.randrange(days))
+        status = rng.choices(TASK_STATUSES, weights=[30, 55, 15])[0]
+        completed_at = datetime.combine(task_date, datetime.min.time()) + timedelta(seconds=rng.randrange(86_400))
+        rows.append({
+            "id": str(uuid.uuid4()), "user_id": 1, "task_description": f"tarefa {rng.randrange(200)}",
+            "task_date": task_date.isoformat(), "status": status,
+            "completed_at": completed_at.isoformat() if status == "completed" else None,
+            "cancellation_reason": rng.choice(REASONS) if status == "cancelled" else None,
+        })
+    return rows
+
+def legacy_frame(rows) -> pd.DataFrame:
+    """Conversão anterior do ProductivityAnalyzer, mantida como referência"""
+    df = pd.DataFrame(rows)
+    df['status'] = pd.Categorical(df['status'], categories=TASK_STATUSES)
+    df['task_date'] = pd.to_datetime(df['task_date'])
+    df['completed_at'] = pd.to_datetime(df['completed_at'])
+    return df
+
+def best_time(func, repeat: int):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def run(sizes, repeat: int) -> dict:
+    results = {}
+    for n_rows in sizes:
+        rows = synthetic_rows(n_rows)
+        # O analisador lê sem descrições (ANALYTICS_COLUMNS); o DataFrame antigo recebia a linha inteira
+        analytics_rows = [{key: value for key, value in row.items() if key != "task_description"} for row in rows]
+        frame_seconds, frame = best_time(lambda: legacy_frame(rows), repeat)
+        table_seconds, table = best_time(lambda: TaskTable.from_rows(analytics_rows), repeat)
+        charts_seconds, _ = best_time(lambda: TaskTables.from_frame(table), repeat)
+        results[f"legacy_frame[{n_rows}]"] = {"seconds": frame_seconds, "bytes": int(frame.memory_usage(deep=True).sum())}
+        results[f"task_table[{n_rows}]"] = {"seconds": table_seconds, "bytes": table.nbytes}
+        results[f"task_tables_from_table[{n_rows}]"] = {"seconds": charts_seconds}
+        print(
+            f"{n_rows:>9,} linhas  DataFrame {frame_seconds * 1000:9.2f} ms {frame.memory_usage(deep=True).sum() / 1e6:8.2f} MB"
+            f"  |  TaskTable {table_seconds * 1000:9.2f} ms {table.nbytes / 1e6:8.3f} MB  |  gráficos {charts_seconds * 1000:7.2f} ms"
+        )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Grava os tempos e a memória em JSON")
+    args = parser.parse_args()
+    
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
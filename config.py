@@ -1,16 +1,53 @@
 import os
-import streamlit as st
+import sys
+
+# Arquivos de secrets que o Streamlit lê (projeto e usuário)
+SECRETS_FILES = [
+    os.path.join(".streamlit", "secrets.toml"),
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+]
+
+def _has_secrets() -> bool:
+    """O st.secrets só é consultado dentro do Streamlit ou se existir um secrets.toml"""
+    return "streamlit" in sys.modules or any(os.path.exists(path) for path in SECRETS_FILES)
 
 # Função para pegar variáveis (prioriza Streamlit secrets)
 def get_config(key):
-    # Primeiro tenta pegar do Streamlit secrets (produção)
+    # Dentro do Streamlit, tenta primeiro os secrets (produção)
+    if "streamlit" in sys.modules:
+        try:
+            return sys.modules["streamlit"].secrets[key]
+        except:
+            pass
+    value = os.getenv(key)
+    if value is not None or not _has_secrets():
+        return value
+    # Fora do Streamlit (bot, jobs), só importa o streamlit se houver um secrets.toml para ler
     try:
+        import streamlit as st
         return st.secrets[key]
     except:
-        # Se não encontrar, pega do ambiente
-        return os.getenv(key)
+        return None
+
+# Chaves opcionais: só do ambiente, para que ler o padrão nunca carregue o streamlit
+def get_optional_config(key, default=None):
+    return os.getenv(key) or default
 
 SUPABASE_URL = get_config("SUPABASE_URL")
 SUPABASE_KEY = get_config("SUPABASE_KEY")
 TELEGRAM_BOT_TOKEN = get_config("TELEGRAM_BOT_TOKEN")
 GEMINI_API_KEY = get_config("GEMINI_API_KEY")
+
+# Armazenamento das tarefas: "supabase" ou "sqlite" (arquivo local, sem rede)
+STORAGE_BACKEND = get_optional_config("STORAGE_BACKEND", "supabase")
+SQLITE_PATH = get_optional_config("SQLITE_PATH", "tasks.sqlite3")
+
+# Cache das respostas do Gemini: "memory", "sqlite" ou "disk"
+LLM_CACHE_BACKEND = get_optional_config("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_PATH = get_optional_config("LLM_CACHE_PATH")
+
+# Cota de requisições do Gemini usada pelo ExtractionService
+GEMINI_REQUESTS_PER_MINUTE = float(get_optional_config("GEMINI_REQUESTS_PER_MINUTE", 15))
+
+# Respostas do Gemini em JSON com schema e streaming; erros persistentes são propagados
+GEMINI_STRUCTURED_OUTPUT = get_optional_config("GEMINI_STRUCTURED_OUTPUT", "").lower() in ("1", "true", "yes")
@@ -1,90 +1,351 @@
-from supabase import create_client, Client
 from config import SUPABASE_URL, SUPABASE_KEY
-from datetime import datetime, date, time
-from typing import List, Dict, Optional
+from analytics_state import STATUS_INDEX, UserAnalyticsState
+from cache import TTLCache
+from metrics import httpx_event_hooks, instrument_class, record_cache
+from db_queries import (
+    Query, analytics_window_start, batched, behavior_analytics_rows, cancellation_changes, chunk_columns,
+    completion_changes, dashboard_aggregates_params, dashboard_tasks_query, empty_aggregates, group_by_user, init_analytics_state_params, latest_analytics_query,
+    new_task_rows, notification_settings_page_query, notification_settings_rows, pending_bulk_query, pending_tasks_query,
+    recent_tasks_query, rollup_refresh_params, rollups_query, task_chunk_query, task_descriptions_query, task_page_query, to_chunk,
+    user_row_query
+)
+from datetime import date, time
+from functools import lru_cache, wraps
+import inspect
+from typing import TYPE_CHECKING, List, Dict, Iterable, Iterator, Optional
 
-class TaskDatabase:
-    def __init__(self):
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+if TYPE_CHECKING:
+    from task_table import TaskTable
+
+# Colunas usadas pelas análises (evita baixar task_description)
+ANALYTICS_COLUMNS = "id,user_id,task_date,status,completed_at,cancellation_reason"
+
+# Colunas exibidas na tabela "Tarefas Recentes"
+RECENT_TASK_COLUMNS = "id,task_date,task_description,status,cancellation_reason"
+
+# Colunas lidas pelo agendador de notificações
+NOTIFICATION_COLUMNS = "user_id,morning_notification_time,reminder_notification_time,last_adjusted_at"
+PENDING_TASK_COLUMNS = "id,user_id,task_description"
+
+# Colunas de daily_task_rollups lidas pelo dashboard
+ROLLUP_COLUMNS = "task_date,pending,completed,cancelled,completion_hours,reasons"
+
+# Validade (segundos) das leituras guardadas em cache
+CACHE_TTLS = {
+    "get_daily_task_count": 30,
+    "get_pending_tasks": 30,
+    "get_tasks_for_dashboard": 60,
+    "get_dashboard_aggregates": 60,
+    "get_task_table": 60,
+    "get_recent_tasks": 60,
+    "get_user_notification_settings": 300,
+    "get_latest_analytics": 300,
+    # Atualizada pelo rollup_refresher em segundo plano, não pelas gravações deste processo
+    "get_daily_rollups": 60,
+}
+TASK_READS = ("get_daily_task_count", "get_pending_tasks", "get_tasks_for_dashboard", "get_task_table", "get_dashboard_aggregates", "get_recent_tasks")
+
+def cached_read(method):
+    """Guarda o resultado da leitura por usuário e argumentos; vale para métodos síncronos e corrotinas"""
+    name = method.__name__
+    
+    def lookup(self, user_id, args, kwargs):
+        key = (name, user_id, *args, *sorted(kwargs.items()))
+        hit, value = self.cache.get(key)
+        record_cache("db", name, hit)
+        return key, hit, value
+    
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(self, user_id, *args, **kwargs):
+            key, hit, value = lookup(self, user_id, args, kwargs)
+            if hit:
+                return value
+            value = await method(self, user_id, *args, **kwargs)
+            self.cache.set(key, value, ttl=CACHE_TTLS[name])
+            return value
+        
+        return async_wrapper
+    
+    @wraps(method)
+    def wrapper(self, user_id, *args, **kwargs):
+        key, hit, value = lookup(self, user_id, args, kwargs)
+        if hit:
+            return value
+        value = method(self, user_id, *args, **kwargs)
+        self.cache.set(key, value, ttl=CACHE_TTLS[name])
+        return value
+    
+    return wrapper
+
+class CachedReads:
+    """Cache de leituras (cached_read) e sua invalidação, comum aos backends síncrono e assíncrono"""
+    
+    cache: TTLCache
+    
+    def cache_stats(self) -> Dict:
+        """Contadores de acertos e faltas do cache de leituras"""
+        return self.cache.stats()
+    
+    def _invalidate(self, user_ids: Iterable[int], methods: Iterable[str]):
+        """Remove do cache as leituras afetadas por uma escrita"""
+        user_ids, methods = set(user_ids), set(methods)
+        self.cache.invalidate(lambda key: key[0] in methods and key[1] in user_ids)
+
+def rollups_to_aggregates(rows: Iterable[Dict], reasons_limit: int = 5) -> Dict:
+    """Soma linhas de daily_task_rollups no mesmo formato de get_dashboard_aggregates"""
+    by_day, hours, reasons = [], [0] * 24, {}
+    for row in rows:
+        for status in STATUS_INDEX:
+            if row[status]:
+                by_day.append({"task_date": row["task_date"], "status": status, "count": row[status]})
+        for hour, count in enumerate(row["completion_hours"] or []):
+            hours[hour] += count
+        for reason, count in (row["reasons"] or {}).items():
+            reasons[reason] = reasons.get(reason, 0) + count
+    return {
+        "by_day": by_day,
+        "by_hour": [{"hour": hour, "count": count} for hour, count in enumerate(hours) if count],
+        "reasons": [
+            {"reason": reason, "count": count}
+            for reason, count in sorted(reasons.items(), key=lambda item: -item[1])[:reasons_limit]
+        ],
+    }
+
+@lru_cache(maxsize=None)
+def get_supabase_client():
+    """Cliente do Supabase do processo, criado no primeiro uso e compartilhado por todos os TaskDatabase"""
+    # Importado aqui para que os backends locais (e o import deste módulo) não carreguem o cliente do Supabase
+    from supabase import create_client
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    # Conta os bytes de cada resposta do PostgREST na operação em execução
+    for event, hooks in httpx_event_hooks().items():
+        client.postgrest.session.event_hooks[event].extend(hooks)
+    return client
+
+@instrument_class("db")
+class TaskDatabase(CachedReads):
+    def __init__(self, cache_size: int = 512):
+        self._connect()
+        self.cache = TTLCache(maxsize=cache_size)
+    
+    def _connect(self):
+        self.client = get_supabase_client()
+    
+    def _select(self, query: Query, **options):
+        """Monta a consulta no cliente do Supabase (options vão para select, ex.: count)"""
+        builder = self.client.table(query.table).select(query.select, **options)
+        for column, operator, value in query.filters:
+            builder = builder.filter(column, operator, value)
+        if query.after:
+            builder = builder.or_(query.keyset())
+        for column, desc in query.orderings():
+            builder = builder.order(column, desc=desc)
+        if query.limit:
+            builder = builder.limit(query.limit)
+        return builder
+    
+    def _fetch(self, query: Query) -> List[Dict]:
+        return self._select(query).execute().data
     
     def add_task(self, user_id: int, task_description: str, task_date: date) -> Dict:
         """Adiciona uma nova tarefa"""
-        data = {
-            "user_id": user_id,
-            "task_description": task_description,
-            "task_date": task_date.isoformat(),
-            "status": "pending"
-        }
-        result = self.client.table("tasks").insert(data).execute()
-        return result.data[0] if result.data else None
+        result = self.client.table("tasks").insert(new_task_rows(user_id, [task_description], task_date)[0]).execute()
+        task = result.data[0] if result.data else None
+        if task:
+            self._invalidate([user_id], TASK_READS)
+        return task
     
+    def add_tasks(self, user_id: int, task_descriptions: List[str], task_date: date) -> List[Dict]:
+        """Adiciona várias tarefas numa única requisição"""
+        if not task_descriptions:
+            return []
+        result = self.client.table("tasks").insert(new_task_rows(user_id, task_descriptions, task_date)).execute()
+        tasks = result.data or []
+        if tasks:
+            self._invalidate([user_id], TASK_READS)
+        return tasks
+    
+    @cached_read
     def get_daily_task_count(self, user_id: int, task_date: date) -> int:
         """Retorna quantidade de tarefas do dia"""
-        result = self.client.table("tasks").select("id").eq("user_id", user_id).eq("task_date", task_date.isoformat()).eq("status", "pending").execute()
-        return len(result.data)
+        # Contagem feita no servidor (HEAD com count=exact), sem baixar os ids
+        result = self._select(pending_tasks_query(user_id, task_date, "id"), count="exact", head=True).execute()
+        return result.count or 0
+    
+    def _update_task(self, task_id: str, changes: Dict) -> Dict:
+        result = self.client.table("tasks").update(changes).eq("id", task_id).execute()
+        task = result.data[0] if result.data else None
+        if task:
+            self._invalidate([task["user_id"]], TASK_READS)
+        return task
     
     def complete_task(self, task_id: str) -> Dict:
         """Marca tarefa como concluída"""
-        data = {
-            "status": "completed",
-            "completed_at": datetime.now().isoformat()
-        }
-        result = self.client.table("tasks").update(data).eq("id", task_id).execute()
-        return result.data[0] if result.data else None
+        return self._update_task(task_id, completion_changes())
     
     def cancel_task(self, task_id: str, reason: str) -> Dict:
         """Cancela tarefa com justificativa"""
-        data = {
-            "status": "cancelled",
-            "cancellation_reason": reason
-        }
-        result = self.client.table("tasks").update(data).eq("id", task_id).execute()
-        return result.data[0] if result.data else None
+        return self._update_task(task_id, cancellation_changes(reason))
     
+    @cached_read
     def get_pending_tasks(self, user_id: int, task_date: date) -> List[Dict]:
         """Busca tarefas pendentes do dia"""
-        result = self.client.table("tasks").select("*").eq("user_id", user_id).eq("task_date", task_date.isoformat()).eq("status", "pending").execute()
-        return result.data
+        return self._fetch(pending_tasks_query(user_id, task_date))
     
+    @cached_read
     def get_tasks_for_dashboard(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Dict]:
         """Busca tarefas para dashboard"""
-        query = self.client.table("tasks").select("*").eq("user_id", user_id)
-        
-        if start_date:
-            query = query.gte("task_date", start_date.isoformat())
-        if end_date:
-            query = query.lte("task_date", end_date.isoformat())
-        
-        result = query.order("task_date", desc=True).execute()
-        return result.data
+        return self._fetch(dashboard_tasks_query(user_id, start_date, end_date))
+    
+    @cached_read
+    def get_task_table(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> "TaskTable":
+        """Tarefas do período em colunas compactas, sem descrições (lidas sob demanda por get_task_descriptions)"""
+        # Importado aqui: o bot e o agendador usam o banco sem carregar o numpy
+        from task_table import TaskTable
+        return TaskTable.from_chunks(self.iter_task_chunks(user_id, start_date, end_date), description_loader=self.get_task_descriptions)
+    
+    def get_task_descriptions(self, task_ids: Iterable[str], batch_size: int = 500) -> Dict[str, str]:
+        """Descrições das tarefas pedidas, por id"""
+        descriptions = {}
+        for batch in batched(list(task_ids), batch_size):
+            descriptions.update((row["id"], row["task_description"]) for row in self._fetch(task_descriptions_query(batch)))
+        return descriptions
     
+    @cached_read
+    def get_dashboard_aggregates(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """Contagens por data/status, por hora de conclusão e principais motivos, agregadas no servidor"""
+        result = self.client.rpc("dashboard_task_aggregates", dashboard_aggregates_params(user_id, start_date, end_date)).execute()
+        return result.data or empty_aggregates()
+    
+    @cached_read
+    def get_recent_tasks(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 20) -> List[Dict]:
+        """Busca só as colunas e linhas exibidas na tabela de tarefas recentes"""
+        return self._fetch(recent_tasks_query(user_id, start_date, end_date, RECENT_TASK_COLUMNS, limit))
+    
+    @cached_read
     def get_user_notification_settings(self, user_id: int) -> Dict:
         """Busca configurações de notificação do usuário"""
-        result = self.client.table("notification_settings").select("*").eq("user_id", user_id).execute()
-        return result.data[0] if result.data else None
+        rows = self._fetch(user_row_query("notification_settings", user_id))
+        return rows[0] if rows else None
     
     def update_notification_settings(self, user_id: int, morning_time: time, reminder_time: time) -> Dict:
         """Atualiza horários de notificação"""
-        data = {
-            "user_id": user_id,
-            "morning_notification_time": morning_time.isoformat(),
-            "reminder_notification_time": reminder_time.isoformat(),
-            "last_adjusted_at": datetime.now().isoformat()
-        }
-        result = self.client.table("notification_settings").upsert(data).execute()
+        result = self.client.table("notification_settings").upsert(notification_settings_rows({user_id: (morning_time, reminder_time)})[0]).execute()
+        self._invalidate([user_id], ["get_user_notification_settings"])
         return result.data[0] if result.data else None
     
     def save_behavior_analytics(self, user_id: int, analytics: Dict) -> Dict:
         """Salva análise de comportamento do usuário"""
-        data = {
-            "user_id": user_id,
-            "analysis_date": date.today().isoformat(),
-            **analytics
-        }
-        result = self.client.table("user_behavior_analytics").upsert(data).execute()
+        result = self.client.table("user_behavior_analytics").upsert(behavior_analytics_rows({user_id: analytics})[0]).execute()
+        self._invalidate([user_id], ["get_latest_analytics"])
         return result.data[0] if result.data else None
     
+    @cached_read
     def get_latest_analytics(self, user_id: int) -> Dict:
         """Busca última análise de comportamento"""
-        result = self.client.table("user_behavior_analytics").select("*").eq("user_id", user_id).order("analysis_date", desc=True).limit(1).execute()
-        return result.data[0] if result.data else None
+        rows = self._fetch(latest_analytics_query(user_id))
+        return rows[0] if rows else None
+    
+    def iter_task_pages(self, start_date: date, page_size: int = 1000, columns: str = ANALYTICS_COLUMNS) -> Iterator[List[Dict]]:
+        """Percorre em páginas as tarefas de todos os usuários, ordenadas por usuário"""
+        last = None
+        while True:
+            rows = self._fetch(task_page_query(start_date, columns, page_size, last))
+            # Só para na página vazia: o PostgREST pode cortar a página em max-rows
+            if not rows:
+                break
+            yield rows
+            last = rows[-1]
+    
+    def iter_task_chunks(self, user_id: Optional[int] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, chunk_size: int = 1000, columns: str = ANALYTICS_COLUMNS) -> Iterator[Dict[str, list]]:
+        """Lê as tarefas em lotes colunares com paginação por chave (task_date, id)"""
+        names = chunk_columns(columns)
+        last = None
+        while True:
+            rows = self._fetch(task_chunk_query(user_id, start_date, end_date, names, chunk_size, last))
+            if not rows:
+                break
+            yield to_chunk(rows, names)
+            last = rows[-1]
+    
+    @cached_read
+    def get_daily_rollups(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None, page_size: int = 1000) -> List[Dict]:
+        """Contagens diárias pré-agregadas do usuário (uma linha por dia com tarefas), em ordem de data"""
+        rows, last = [], None
+        while True:
+            page = self._fetch(rollups_query(user_id, start_date, end_date, ROLLUP_COLUMNS, page_size, last))
+            if not page:
+                break
+            rows += page
+            last = page[-1]["task_date"]
+        return rows
+    
+    def get_rollup_aggregates(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """Mesmo formato de get_dashboard_aggregates, somado a partir de daily_task_rollups (para períodos longos)"""
+        return rollups_to_aggregates(self.get_daily_rollups(user_id, start_date, end_date))
+    
+    def refresh_daily_rollups(self, completed_since: Optional[str] = None, date_since: Optional[date] = None) -> Dict:
+        """Recalcula os dias com tarefas concluídas desde completed_since ou com task_date >= date_since (sem ambos, tudo).
+        
+        Devolve {"rows": dias recalculados, "completed_watermark": maior completed_at visto}.
+        """
+        result = self.client.rpc("refresh_daily_task_rollups", rollup_refresh_params(completed_since, date_since)).execute()
+        return result.data
+    
+    def get_pending_tasks_bulk(self, user_ids: Iterable[int], task_date: date, batch_size: int = 500, page_size: int = 1000) -> Dict[int, List[Dict]]:
+        """Tarefas pendentes do dia de vários usuários, agrupadas por usuário (uma consulta por lote de ids)"""
+        tasks_by_user: Dict[int, List[Dict]] = {}
+        for batch in batched(sorted(set(user_ids)), batch_size):
+            last = None
+            while True:
+                rows = self._fetch(pending_bulk_query(batch, task_date, PENDING_TASK_COLUMNS, page_size, last))
+                if not rows:
+                    break
+                group_by_user(rows, tasks_by_user)
+                last = rows[-1]
+        return tasks_by_user
+    
+    def iter_notification_settings(self, updated_since: Optional[str] = None, page_size: int = 1000) -> Iterator[List[Dict]]:
+        """Percorre em páginas os horários de notificação; com updated_since, só as linhas ajustadas desde então"""
+        last_user = None
+        while True:
+            rows = self._fetch(notification_settings_page_query(updated_since, NOTIFICATION_COLUMNS, page_size, last_user))
+            if not rows:
+                break
+            yield rows
+            last_user = rows[-1]["user_id"]
+    
+    def save_behavior_analytics_bulk(self, analytics_by_user: Dict[int, Dict], batch_size: int = 500) -> int:
+        """Salva análises de vários usuários em upserts em lote"""
+        rows = behavior_analytics_rows(analytics_by_user)
+        for batch in batched(rows, batch_size):
+            self.client.table("user_behavior_analytics").upsert(batch).execute()
+        self._invalidate(analytics_by_user, ["get_latest_analytics"])
+        return len(rows)
+    
+    def update_notification_settings_bulk(self, times_by_user: Dict[int, tuple], batch_size: int = 500) -> int:
+        """Atualiza horários de notificação de vários usuários em lote"""
+        rows = notification_settings_rows(times_by_user)
+        for batch in batched(rows, batch_size):
+            self.client.table("notification_settings").upsert(batch).execute()
+        self._invalidate(times_by_user, ["get_user_notification_settings"])
+        return len(rows)
+    
+    def get_analytics_state(self, user_id: int) -> Optional[UserAnalyticsState]:
+        """Busca os agregados incrementais do usuário (sempre do banco, onde as escritas aplicam as variações)"""
+        rows = self._fetch(user_row_query("user_analytics_state", user_id, "user_id,days"))
+        return UserAnalyticsState.from_row(rows[0]) if rows else None
+    
+    def build_analytics_state(self, user_id: int, days_back: int = 30, chunk_size: int = 1000) -> UserAnalyticsState:
+        """Agrega a janela lendo lotes paginados, sem manter as tarefas brutas em memória"""
+        state = UserAnalyticsState(user_id, window_days=days_back)
+        for chunk in self.iter_task_chunks(user_id, analytics_window_start(days_back), chunk_size=chunk_size):
+            state.add_chunk(chunk)
+        state.expire()
+        return state
+    
+    def init_analytics_state(self, user_id: int, days_back: int = 30) -> UserAnalyticsState:
+        """Monta e grava os agregados do usuário no servidor, se ainda não existirem, sem perder escritas concorrentes"""
+        result = self.client.rpc("init_analytics_state", init_analytics_state_params(user_id, days_back)).execute()
+        return UserAnalyticsState.from_row({"user_id": user_id, "days": result.data}, days_back)
@@ -0,0 +1,202 @@
+from datetime import datetime, date, time, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Consultas e linhas do PostgREST montadas uma única vez para todos os backends: TaskDatabase (cliente
+# do Supabase) e AsyncTaskDatabase (httpx) só as executam, LocalTaskDatabase as traduz para SQL
+
+Filter = Tuple[str, str, str]
+# Última linha lida na paginação por chave: ((coluna1, valor1), (coluna2, valor2))
+Keyset = Tuple[Tuple[str, Any], Tuple[str, Any]]
+
+class Query(NamedTuple):
+    """Leitura de uma tabela: filtros (coluna, operador, valor) e ordem no formato do PostgREST ("task_date.desc,id.asc")"""
+    table: str
+    select: str
+    filters: Tuple[Filter, ...] = ()
+    # Paginação por chave: só linhas depois desta posição, na ordem das suas duas colunas
+    after: Optional[Keyset] = None
+    order: Optional[str] = None
+    limit: Optional[int] = None
+    
+    def params(self) -> List[Tuple[str, str]]:
+        """Parâmetros da URL, em pares (a mesma coluna pode aparecer mais de uma vez)"""
+        params = [("select", self.select)]
+        params += [(column, f"{operator}.{value}") for column, operator, value in self.filters]
+        if self.after:
+            params.append(("or", f"({self.keyset()})"))
+        if self.order:
+            params.append(("order", self.order))
+        if self.limit:
+            params.append(("limit", str(self.limit)))
+        return params
+    
+    def keyset(self) -> str:
+        """Condição de after no formato do filtro or do PostgREST"""
+        (first, first_value), (second, second_value) = self.after
+        return f"{first}.gt.{first_value},and({first}.eq.{first_value},{second}.gt.{second_value})"
+    
+    def orderings(self) -> Iterator[Tuple[str, bool]]:
+        """(coluna, decrescente) de cada termo de order"""
+        for term in self.order.split(",") if self.order else []:
+            column, direction = term.rsplit(".", 1)
+            yield column, direction == "desc"
+
+def date_filters(user_id: Optional[int], start_date: Optional[date], end_date: Optional[date]) -> Tuple[Filter, ...]:
+    filters = [("user_id", "eq", str(user_id))] if user_id is not None else []
+    if start_date:
+        filters.append(("task_date", "gte", start_date.isoformat()))
+    if end_date:
+        filters.append(("task_date", "lte", end_date.isoformat()))
+    return tuple(filters)
+
+def keyset_after(last: Optional[Dict], first: str, second: str) -> Optional[Keyset]:
+    """Posição de last na ordem (first, second): a paginação por chave das leituras em lote"""
+    return ((first, last[first]), (second, last[second])) if last else None
+
+def pending_tasks_query(user_id: int, task_date: date, select: str = "*") -> Query:
+    return Query("tasks", select, (("user_id", "eq", str(user_id)), ("task_date", "eq", task_date.isoformat()), ("status", "eq", "pending")))
+
+def dashboard_tasks_query(user_id: int, start_date: Optional[date], end_date: Optional[date]) -> Query:
+    return Query("tasks", "*", date_filters(user_id, start_date, end_date), order="task_date.desc")
+
+def recent_tasks_query(user_id: int, start_date: Optional[date], end_date: Optional[date], columns: str, limit: int) -> Query:
+    return Query("tasks", columns, date_filters(user_id, start_date, end_date), order="task_date.desc", limit=limit)
+
+def task_descriptions_query(task_ids: List[str]) -> Query:
+    return Query("tasks", "id,task_description", (("id", "in", f"({','.join(task_ids)})"),))
+
+def user_row_query(table: str, user_id: int, select: str = "*") -> Query:
+    return Query(table, select, (("user_id", "eq", str(user_id)),))
+
+def latest_analytics_query(user_id: int) -> Query:
+    return Query("user_behavior_analytics", "*", (("user_id", "eq", str(user_id)),), order="analysis_date.desc", limit=1)
+
+def chunk_columns(columns: str) -> List[str]:
+    """Colunas pedidas mais as chaves da paginação de iter_task_chunks"""
+    names = columns.split(",")
+    for key in ("task_date", "id"):
+        if key not in names:
+            names.append(key)
+    return names
+
+def task_chunk_query(user_id: Optional[int], start_date: Optional[date], end_date: Optional[date], names: List[str],
+                     chunk_size: int, last: Optional[Dict] = None) -> Query:
+    """Página de iter_task_chunks depois da linha last, na ordem (task_date, id)"""
+    return Query(
+        "tasks", ",".join(names), date_filters(user_id, start_date, end_date),
+        after=keyset_after(last, "task_date", "id"),
+        order="task_date.asc,id.asc", limit=chunk_size
+    )
+
+def to_chunk(rows: List[Dict], names: List[str]) -> Dict[str, list]:
+    """Página de linhas em formato colunar ({coluna: valores})"""
+    return {name: [row.get(name) for row in rows] for name in names}
+
+def task_page_query(start_date: date, columns: str, page_size: int, last: Optional[Dict] = None) -> Query:
+    """Página de iter_task_pages (todos os usuários) depois da linha last, na ordem (user_id, id)"""
+    return Query(
+        "tasks", columns, (("task_date", "gte", start_date.isoformat()),),
+        after=keyset_after(last, "user_id", "id"),
+        order="user_id.asc,id.asc", limit=page_size
+    )
+
+def pending_bulk_query(user_ids: List[int], task_date: date, columns: str, page_size: int, last: Optional[Dict] = None) -> Query:
+    """Página de pendentes do dia de um lote de usuários, na ordem (user_id, id)"""
+    # Lotes de ids mantêm a URL do filtro in.(...) num tamanho aceito pelo PostgREST
+    filters = (("user_id", "in", f"({','.join(map(str, user_ids))})"), ("task_date", "eq", task_date.isoformat()), ("status", "eq", "pending"))
+    return Query(
+        "tasks", columns, filters,
+        after=keyset_after(last, "user_id", "id"),
+        order="user_id.asc,id.asc", limit=page_size
+    )
+
+def group_by_user(rows: Iterable[Dict], tasks_by_user: Dict[int, List[Dict]]) -> Dict[int, List[Dict]]:
+    for row in rows:
+        tasks_by_user.setdefault(row["user_id"], []).append(row)
+    return tasks_by_user
+
+def notification_settings_page_query(updated_since: Optional[str], columns: str, page_size: int, last_user: Optional[int] = None) -> Query:
+    filters = []
+    if updated_since:
+        filters.append(("last_adjusted_at", "gte", updated_since))
+    if last_user is not None:
+        filters.append(("user_id", "gt", str(last_user)))
+    return Query("notification_settings", columns, tuple(filters), order="user_id.asc", limit=page_size)
+
+def rollups_query(user_id: int, start_date: Optional[date], end_date: Optional[date], columns: str, page_size: int,
+                  last: Optional[str] = None) -> Query:
+    """Página de daily_task_rollups depois do dia last"""
+    filters = date_filters(user_id, start_date, end_date)
+    if last:
+        filters += (("task_date", "gt", last),)
+    return Query("daily_task_rollups", columns, filters, order="task_date.asc", limit=page_size)
+
+def batched(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def new_task_rows(user_id: int, task_descriptions: Iterable[str], task_date: date) -> List[Dict]:
+    return [
+        {
+            "user_id": user_id,
+            "task_description": description,
+            "task_date": task_date.isoformat(),
+            "status": "pending"
+        }
+        for description in task_descriptions
+    ]
+
+def completion_changes() -> Dict:
+    return {
+        "status": "completed",
+        "completed_at": datetime.now().isoformat()
+    }
+
+def cancellation_changes(reason: str) -> Dict:
+    return {
+        "status": "cancelled",
+        "cancellation_reason": reason
+    }
+
+def notification_settings_rows(times_by_user: Dict[int, Tuple[time, time]]) -> List[Dict]:
+    # No Postgres o gatilho notification_settings_touch troca last_adjusted_at pelo now() do servidor
+    adjusted_at = datetime.now().isoformat()
+    return [
+        {
+            "user_id": user_id,
+            "morning_notification_time": morning_time.isoformat(),
+            "reminder_notification_time": reminder_time.isoformat(),
+            "last_adjusted_at": adjusted_at
+        }
+        for user_id, (morning_time, reminder_time) in times_by_user.items()
+    ]
+
+def behavior_analytics_rows(analytics_by_user: Dict[int, Dict]) -> List[Dict]:
+    analysis_date = date.today().isoformat()
+    return [
+        {"user_id": user_id, "analysis_date": analysis_date, **analytics}
+        for user_id, analytics in analytics_by_user.items()
+    ]
+
+def init_analytics_state_params(user_id: int, days_back: int) -> Dict:
+    return {"p_user_id": user_id, "p_window_days": days_back}
+
+def analytics_window_start(days_back: int) -> date:
+    """Primeiro dia lido ao montar os agregados de uma janela"""
+    return date.today() - timedelta(days=days_back)
+
+def dashboard_aggregates_params(user_id: int, start_date: Optional[date], end_date: Optional[date]) -> Dict:
+    return {
+        "p_user_id": user_id,
+        "p_start": start_date.isoformat() if start_date else None,
+        "p_end": end_date.isoformat() if end_date else None
+    }
+
+def empty_aggregates() -> Dict:
+    return {"by_day": [], "by_hour": [], "reasons": []}
+
+def rollup_refresh_params(completed_since: Optional[str], date_since: Optional[date]) -> Dict:
+    return {
+        "p_completed_since": completed_since,
+        "p_date_since": date_since.isoformat() if date_since else None
+    }
@@ -0,0 +1,185 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import GEMINI_REQUESTS_PER_MINUTE
+from llm_cache import normalize_text
+from llm_processor import (
+    JSON_GENERATION_CONFIG, MODEL_NAME, TaskProcessor, build_extraction_prompt, parse_json_response, parse_tasks_response, retryable_errors
+)
+from metrics import instrumented, record_error, record_llm_usage
+from rate_limit import TokenBucket
+
+def build_batch_prompt(messages: List[str]) -> str:
+    """Prompt único para extrair as tarefas de várias mensagens curtas"""
+    numbered = "\n".join(f'{i}: "{message}"' for i, message in enumerate(messages))
+    return f"""
+Você é um assistente que identifica tarefas em mensagens de texto.
+
+Abaixo há várias mensagens independentes, cada uma com um número.
+Para cada mensagem, extraia APENAS as tarefas mencionadas.
+Cada tarefa deve ser clara e objetiva.
+Máximo de 5 tarefas por mensagem.
+
+Mensagens:
+{numbered}
+
+Retorne APENAS um JSON no formato:
+{{"results": [{{"id": 0, "tasks": ["tarefa 1", ...]}}, {{"id": 1, "tasks": [...]}}, ...]}}
+
+Inclua um item para cada número, mesmo sem tarefas.
+Não adicione nenhum texto antes ou depois do JSON.
+"""
+
+def split_batch_response(response_text: str, size: int) -> Dict[int, List[str]]:
+    """Separa a resposta em lote por número de mensagem; ids ausentes ficam de fora"""
+    result = parse_json_response(response_text)
+    tasks_by_id = {}
+    for item in result.get("results", []):
+        message_id = item.get("id")
+        if isinstance(message_id, int) and 0 <= message_id < size:
+            tasks_by_id[message_id] = list(item.get("tasks", []))[:5]
+    return tasks_by_id
+
+class ExtractionService:
+    """Fila assíncrona de extração com pool de workers, limite de cota e micro-lotes opcionais"""
+    
+    def __init__(self, processor: TaskProcessor, workers: int = 8, requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+                 batch_size: int = 1, batch_window: float = 0.05, short_message_chars: int = 200,
+                 max_retries: int = 4, backoff_base: float = 1.0, queue_size: int = 1000):
+        self.processor = processor
+        self.workers = workers
+        self.limiter = TokenBucket(requests_per_minute)
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.short_message_chars = short_message_chars
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._background = set()
+    
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+    
+    @instrumented("llm", "extraction_service.extract_tasks")
+    async def extract_tasks(self, user_message: str) -> List[str]:
+        """Extrai as tarefas de uma mensagem; listas simples e repetições não entram na fila"""
+        tasks = self.processor.extract_local(user_message)
+        if tasks is not None:
+            return tasks
+        cached = self.processor.cache.get("extract_tasks", MODEL_NAME, normalize_text(user_message))
+        if cached is not None:
+            return cached
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user_message, future))
+        try:
+            return await future
+        except Exception as e:
+            if self.processor.structured:
+                raise
+            record_error("llm", "extraction_service.extract_tasks", e)
+            print(f"Erro ao processar com Gemini: {e}")
+            return []
+    
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.batch_size > 1 and len(batch[0][0]) <= self.short_message_chars:
+                await self._fill_batch(batch)
+            try:
+                if len(batch) == 1:
+                    await self._run_single(*batch[0])
+                else:
+                    await self._run_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    async def _fill_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Junta mensagens curtas que chegarem dentro da janela do micro-lote"""
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if len(item[0]) > self.short_message_chars:
+                # Mensagem longa segue sozinha, sem esperar o lote
+                task = asyncio.create_task(self._run_and_release(item))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+                continue
+            batch.append(item)
+    
+    async def _run_and_release(self, item: Tuple[str, asyncio.Future]):
+        try:
+            await self._run_single(*item)
+        finally:
+            self.queue.task_done()
+    
+    @instrumented("llm", "extraction_service.generate")
+    async def _generate(self, prompt: str, generation_config: Optional[dict] = None) -> str:
+        """Chama o modelo respeitando a cota, com espera exponencial nos erros de cota"""
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            try:
+                response = await self.processor.model.generate_content_async(prompt, generation_config=generation_config)
+                record_llm_usage("extraction_service.generate", response)
+                return response.text
+            except retryable_errors():
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_base * 2 ** attempt * (1 + random.random()))
+    
+    async def _run_single(self, user_message: str, future: asyncio.Future):
+        try:
+            generation_config = JSON_GENERATION_CONFIG if self.processor.structured else None
+            tasks = parse_tasks_response(await self._generate(build_extraction_prompt(user_message), generation_config))
+            self.processor.cache.set("extract_tasks", MODEL_NAME, normalize_text(user_message), tasks)
+            if not future.done():
+                future.set_result(tasks)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+    
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        messages = [message for message, _ in batch]
+        try:
+            tasks_by_id = split_batch_response(await self._generate(build_batch_prompt(messages)), len(messages))
+        except (ValueError, AttributeError):
+            tasks_by_id = {}
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        retry = []
+        for i, (message, future) in enumerate(batch):
+            if i in tasks_by_id:
+                self.processor.cache.set("extract_tasks", MODEL_NAME, normalize_text(message), tasks_by_id[i])
+                if not future.done():
+                    future.set_result(tasks_by_id[i])
+            else:
+                retry.append((message, future))
+        # Mensagens que o lote não devolveu são refeitas individualmente
+        await asyncio.gather(*(self._run_single(message, future) for message, future in retry))
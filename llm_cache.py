@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional
+
+from cache import TTLCache
+from metrics import record_cache
+
+def normalize_text(text: str) -> str:
+    """Normaliza a mensagem para que variações triviais caiam na mesma chave"""
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    return " ".join(text.split()).strip(" .!;")
+
+def cache_key(kind: str, model_name: str, inputs: Any) -> str:
+    """Chave de conteúdo: hash do tipo de chamada, do modelo e das entradas normalizadas"""
+    payload = json.dumps({"kind": kind, "model": model_name, "inputs": inputs}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryCacheBackend:
+    """Respostas guardadas em memória, no processo"""
+    
+    def __init__(self, maxsize: int = 2048):
+        self._cache = TTLCache(maxsize=maxsize)
+    
+    def get(self, key: str) -> Optional[Any]:
+        hit, value = self._cache.get(key)
+        return value if hit else None
+    
+    def set(self, key: str, value: Any, ttl: float):
+        self._cache.set(key, value, ttl)
+
+class SQLiteCacheBackend:
+    """Respostas persistidas num arquivo SQLite, com despejo das menos usadas"""
+    
+    def __init__(self, path: str = "llm_cache.sqlite3", maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "create table if not exists llm_cache (key text primary key, value text not null, expires_at real not null, accessed_at real not null)"
+            )
+            self.conn.execute("create index if not exists llm_cache_accessed_idx on llm_cache (accessed_at)")
+    
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute("select value, expires_at from llm_cache where key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self.conn.execute("delete from llm_cache where key = ?", (key,))
+                return None
+            self.conn.execute("update llm_cache set accessed_at = ? where key = ?", (now, key))
+            return json.loads(row[0])
+    
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "insert or replace into llm_cache (key, value, expires_at, accessed_at) values (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            self.conn.execute("delete from llm_cache where expires_at <= ?", (now,))
+            self.conn.execute(
+                "delete from llm_cache where key in (select key from llm_cache order by accessed_at desc limit -1 offset ?)",
+                (self.maxsize,)
+            )
+
+class DiskCacheBackend:
+    """Respostas guardadas como arquivos JSON num diretório"""
+    
+    def __init__(self, directory: str = ".llm_cache", maxsize: int = 10000):
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)
+        return entry["value"]
+    
+    def set(self, key: str, value: Any, ttl: float):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+    
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+BACKENDS = {
+    "memory": MemoryCacheBackend,
+    "sqlite": SQLiteCacheBackend,
+    "disk": DiskCacheBackend,
+}
+
+class LLMCache:
+    """Cache de respostas do modelo endereçado pelo conteúdo das entradas"""
+    
+    def __init__(self, backend=None, ttl: float = 7 * 24 * 3600):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, kind: str, model_name: str, inputs: Any) -> Optional[Any]:
+        """Resposta guardada para estas entradas, ou None"""
+        value = self.backend.get(cache_key(kind, model_name, inputs))
+        record_cache("llm", kind, value is not None)
+        if value is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+    
+    def set(self, kind: str, model_name: str, inputs: Any, value: Any):
+        self.backend.set(cache_key(kind, model_name, inputs), value, self.ttl)
+    
+    def get_or_compute(self, kind: str, model_name: str, inputs: Any, compute: Callable[[], Any]) -> Any:
+        """Devolve a resposta guardada ou chama o modelo e guarda o resultado"""
+        value = self.get(kind, model_name, inputs)
+        if value is not None:
+            return value
+        value = compute()
+        self.set(kind, model_name, inputs, value)
+        return value
+    
+    def stats(self) -> Dict[str, Optional[float]]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else None}
+
+def create_llm_cache(backend: str = "memory", path: Optional[str] = None, maxsize: Optional[int] = None, ttl: float = 7 * 24 * 3600) -> LLMCache:
+    """Monta o cache com o backend escolhido ("memory", "sqlite" ou "disk")"""
+    kwargs = {}
+    if path and backend != "memory":
+        kwargs["path" if backend == "sqlite" else "directory"] = path
+    if maxsize:
+        kwargs["maxsize"] = maxsize
+    return LLMCache(BACKENDS[backend](**kwargs), ttl=ttl)
@@ -1,17 +1,41 @@
-import google.generativeai as genai
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, GEMINI_STRUCTURED_OUTPUT, LLM_CACHE_BACKEND, LLM_CACHE_PATH
+from llm_cache import LLMCache, create_llm_cache, normalize_text
+from local_extractor import extract_tasks_locally
+from metrics import instrumented, record_error, record_llm_usage
 import json
-from typing import List
+import random
+import time
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional
 
-class TaskProcessor:
-    def __init__(self):
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    def extract_tasks(self, user_message: str) -> List[str]:
-        """Extrai tarefas da mensagem do usuário usando Gemini"""
-        
-        prompt = f"""
+MODEL_NAME = 'gemini-1.5-flash'
+
+# Saída restrita por schema: o modelo devolve só {"tasks": [...]}, sem cercas de markdown
+TASKS_SCHEMA = {
+    "type": "object",
+    "properties": {"tasks": {"type": "array", "items": {"type": "string"}}},
+    "required": ["tasks"],
+}
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": TASKS_SCHEMA}
+
+# Campos dos analytics que entram no prompt (e na chave do cache) das sugestões
+SUGGESTION_FIELDS = ('best_completion_hour', 'worst_completion_hour', 'best_day_of_week', 'productivity_score', 'avg_completion_rate')
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """Erros de cota ou indisponibilidade que valem nova tentativa com espera"""
+    # Importado no primeiro uso: o cliente do Google só carrega quando o modelo é chamado
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+
+def build_extraction_prompt(user_message: str) -> str:
+    """Prompt de extração de tarefas de uma mensagem"""
+    return f"""
 Você é um assistente que identifica tarefas em mensagens de texto.
 
 Analise a seguinte mensagem e extraia APENAS as tarefas mencionadas.
@@ -26,26 +50,25 @@ Retorne APENAS um JSON no formato:
 
 Não adicione nenhum texto antes ou depois do JSON.
 """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text.replace("```json", "").replace("```", "").strip()
-            elif response_text.startswith("```"):
-                response_text = response_text.replace("```", "").strip()
-            
-            result = json.loads(response_text)
-            tasks = result.get("tasks", [])
-            return tasks[:5]
-        except Exception as e:
-            print(f"Erro ao processar com Gemini: {e}")
-            return []
-    
-    def suggest_task_optimization(self, user_analytics: dict) -> str:
-        """Sugere otimizações baseadas em analytics"""
-        prompt = f"""
+
+def parse_json_response(response_text: str):
+    """Remove cercas de código markdown e decodifica o JSON da resposta"""
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text.replace("```json", "").replace("```", "").strip()
+    elif response_text.startswith("```"):
+        response_text = response_text.replace("```", "").strip()
+    return json.loads(response_text)
+
+def parse_tasks_response(response_text: str) -> List[str]:
+    """Lê a lista de tarefas da resposta do modelo (máximo de 5)"""
+    result = parse_json_response(response_text)
+    tasks = result.get("tasks", [])
+    return tasks[:5]
+
+def build_suggestion_prompt(user_analytics: dict) -> str:
+    """Prompt de sugestões a partir dos analytics do usuário"""
+    return f"""
 Com base nos seguintes dados de produtividade do usuário, forneça 3 sugestões práticas e diretas:
 
 Melhor horário: {user_analytics.get('best_completion_hour')}h
@@ -57,9 +80,188 @@ Taxa de conclusão: {user_analytics.get('avg_completion_rate')}%
 Forneça 3 sugestões numeradas, cada uma com no máximo 25 palavras.
 Seja direto e prático.
 """
+
+class IncrementalTaskParser:
+    """Lê as tarefas de um JSON que chega em pedaços, entregando cada uma assim que sua string fecha"""
+    
+    def __init__(self, limit: int = 5):
+        self.limit = limit
+        self.buffer = ""
+        self.tasks: List[str] = []
+        self._pos = 0
+        self._in_array = False
+        self._string_start = None
+        self._escaped = False
+    
+    def feed(self, text: str) -> List[str]:
+        """Acrescenta um pedaço da resposta e devolve as tarefas que ficaram completas"""
+        self.buffer += text
+        completed = []
+        while self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            if self._string_start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    if self._in_array and len(self.tasks) < self.limit:
+                        task = json.loads(self.buffer[self._string_start:self._pos + 1])
+                        self.tasks.append(task)
+                        completed.append(task)
+                    self._string_start = None
+            elif char == '"':
+                self._string_start = self._pos
+            elif char == "[":
+                self._in_array = True
+            elif char == "]":
+                self._in_array = False
+            self._pos += 1
+        return completed
+    
+    def close(self) -> List[str]:
+        """Valida a resposta completa (ValueError se malformada) e devolve tarefas ainda não entregues"""
+        return parse_tasks_response(self.buffer)[len(self.tasks):]
+
+class TaskProcessor:
+    def __init__(self, model=None, cache: Optional[LLMCache] = None, local_threshold: float = 0.8,
+                 structured: bool = GEMINI_STRUCTURED_OUTPUT, max_retries: int = 3, backoff_base: float = 1.0):
+        if model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=GEMINI_API_KEY)
+            model = genai.GenerativeModel(MODEL_NAME)
+        self.model = model
+        self.cache = cache or create_llm_cache(LLM_CACHE_BACKEND, LLM_CACHE_PATH)
+        # Confiança mínima do extrator local para dispensar o modelo (acima de 1 desliga o atalho)
+        self.local_threshold = local_threshold
+        self.structured = structured
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+    
+    def extract_local(self, user_message: str) -> Optional[List[str]]:
+        """Tarefas de listas simples resolvidas sem o modelo, ou None se a mensagem precisa do Gemini"""
+        tasks, confidence = extract_tasks_locally(user_message)
+        return tasks if confidence >= self.local_threshold else None
+    
+    @instrumented("llm")
+    def extract_tasks(self, user_message: str) -> List[str]:
+        """Extrai tarefas da mensagem do usuário, usando Gemini só quando o extrator local não resolve"""
+        tasks = self.extract_local(user_message)
+        if tasks is not None:
+            return tasks
+        try:
+            # Respostas com falha não entram no cache
+            return self.cache.get_or_compute(
+                "extract_tasks", MODEL_NAME, normalize_text(user_message),
+                lambda: self._extract_tasks_uncached(user_message)
+            )
+        except Exception as e:
+            if self.structured:
+                raise
+            record_error("llm", "extract_tasks", e)
+            print(f"Erro ao processar com Gemini: {e}")
+            return []
+    
+    @instrumented("llm", "extract_tasks.model")
+    def _extract_tasks_uncached(self, user_message: str) -> List[str]:
+        if self.structured:
+            # Nada chega ao chamador antes do fim: uma resposta malformada no meio é refeita por inteiro
+            return self._collect_with_retries(lambda: self._stream_tasks_once(user_message))
+        response = self.model.generate_content(build_extraction_prompt(user_message))
+        record_llm_usage("extract_tasks", response)
+        return parse_tasks_response(response.text)
+    
+    @instrumented("llm")
+    def stream_tasks(self, user_message: str) -> Iterator[str]:
+        """Gera as tarefas conforme o modelo responde, para o bot confirmar a primeira antes do fim.
+        
+        Falhas são refeitas com espera exponencial enquanto nenhuma tarefa foi entregue; depois disso são propagadas.
+        """
+        tasks = self.extract_local(user_message)
+        if tasks is None:
+            tasks = self.cache.get("extract_tasks", MODEL_NAME, normalize_text(user_message))
+        if tasks is not None:
+            yield from tasks
+            return
         
+        tasks = []
+        for task in self._with_retries(lambda: self._stream_tasks_once(user_message)):
+            tasks.append(task)
+            yield task
+        self.cache.set("extract_tasks", MODEL_NAME, normalize_text(user_message), tasks)
+    
+    def _stream_tasks_once(self, user_message: str) -> Iterator[str]:
+        parser = IncrementalTaskParser()
+        for text in self._stream_text(build_extraction_prompt(user_message), JSON_GENERATION_CONFIG, "extract_tasks"):
+            yield from parser.feed(text)
+        yield from parser.close()
+    
+    def _stream_text(self, prompt: str, generation_config: Optional[dict] = None, operation: str = "generate") -> Iterator[str]:
+        chunk = None
+        for chunk in self.model.generate_content(prompt, generation_config=generation_config, stream=True):
+            if chunk.text:
+                yield chunk.text
+        # O último pedaço traz o uso de tokens acumulado da resposta
+        record_llm_usage(operation, chunk)
+    
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * 2 ** attempt * (1 + random.random())
+    
+    def _with_retries(self, make_stream: Callable[[], Iterator]) -> Iterator:
+        """Refaz a chamada em erros de cota ou resposta malformada, só enquanto nada foi entregue ao consumidor"""
+        for attempt in range(self.max_retries + 1):
+            delivered = False
+            try:
+                for item in make_stream():
+                    yield item
+                    # O consumidor pediu o próximo: o item anterior já foi usado e não pode ser desfeito
+                    delivered = True
+                return
+            except retryable_errors() + (ValueError,):
+                if delivered or attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+    
+    def _collect_with_retries(self, make_stream: Callable[[], Iterator]) -> list:
+        """Lê a resposta inteira antes de devolver, refazendo a chamada em qualquer falha no meio"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return list(make_stream())
+            except retryable_errors() + (ValueError,):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+    
+    @instrumented("llm")
+    def suggest_task_optimization(self, user_analytics: dict) -> str:
+        """Sugere otimizações baseadas em analytics"""
+        inputs = {field: user_analytics.get(field) for field in SUGGESTION_FIELDS}
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except:
+            return self.cache.get_or_compute(
+                "suggest_task_optimization", MODEL_NAME, inputs,
+                lambda: self._suggest_uncached(inputs)
+            )
+        except Exception as e:
+            record_error("llm", "suggest_task_optimization", e)
             return "Continue mantendo sua consistência nas tarefas diárias."
+    
+    @instrumented("llm")
+    def stream_suggestions(self, user_analytics: dict) -> Iterator[str]:
+        """Gera as sugestões em pedaços de texto (para st.write_stream); a resposta completa vai para o cache"""
+        inputs = {field: user_analytics.get(field) for field in SUGGESTION_FIELDS}
+        cached = self.cache.get("suggest_task_optimization", MODEL_NAME, inputs)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        for text in self._with_retries(lambda: self._stream_text(build_suggestion_prompt(inputs), operation="suggest_task_optimization")):
+            chunks.append(text)
+            yield text
+        self.cache.set("suggest_task_optimization", MODEL_NAME, inputs, "".join(chunks).strip())
+    
+    @instrumented("llm", "suggest_task_optimization.model")
+    def _suggest_uncached(self, user_analytics: dict) -> str:
+        response = self.model.generate_content(build_suggestion_prompt(user_analytics))
+        record_llm_usage("suggest_task_optimization", response)
+        return response.text.strip()
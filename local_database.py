@@ -0,0 +1,415 @@
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, date, time
+from typing import List, Dict, Optional
+
+from analytics_state import STATUS_INDEX, UserAnalyticsState, analytics_delta
+from metrics import instrument_class
+from database import TaskDatabase, ROLLUP_COLUMNS, TASK_READS, cached_read
+from db_queries import Query, analytics_window_start
+
+SCHEMA = """
+create table if not exists tasks (
+    id text primary key,
+    user_id integer not null,
+    task_description text,
+    task_date text not null,
+    status text not null default 'pending',
+    completed_at text,
+    cancellation_reason text,
+    created_at text not null
+);
+create index if not exists tasks_user_date_status_idx on tasks (user_id, task_date, status);
+create index if not exists tasks_user_id_idx on tasks (user_id, id);
+create index if not exists tasks_completed_at_idx on tasks (completed_at);
+create index if not exists tasks_task_date_idx on tasks (task_date);
+
+create table if not exists notification_settings (
+    user_id integer primary key,
+    morning_notification_time text,
+    reminder_notification_time text,
+    last_adjusted_at text
+);
+create index if not exists notification_settings_adjusted_idx on notification_settings (last_adjusted_at);
+
+-- As métricas ficam num JSON: o conjunto de campos é o de ProductivityAnalyzer.compute_analytics
+create table if not exists user_behavior_analytics (
+    user_id integer not null,
+    analysis_date text not null,
+    analytics text not null,
+    primary key (user_id, analysis_date)
+);
+
+create table if not exists user_analytics_state (
+    user_id integer primary key,
+    days text not null default '{}',
+    updated_at text not null
+);
+
+-- completion_hours (24 posições) e reasons ficam em JSON
+create table if not exists daily_task_rollups (
+    user_id integer not null,
+    task_date text not null,
+    pending integer not null default 0,
+    completed integer not null default 0,
+    cancelled integer not null default 0,
+    completion_hours text not null,
+    reasons text not null default '{}',
+    refreshed_at text not null,
+    primary key (user_id, task_date)
+);
+"""
+
+# Operadores dos filtros do PostgREST usados em db_queries
+SQL_OPERATORS = {"eq": "=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+SETTINGS_UPSERT = """
+insert into notification_settings (user_id, morning_notification_time, reminder_notification_time, last_adjusted_at)
+values (?, ?, ?, ?)
+on conflict (user_id) do update set
+    morning_notification_time = excluded.morning_notification_time,
+    reminder_notification_time = excluded.reminder_notification_time,
+    last_adjusted_at = excluded.last_adjusted_at
+"""
+ROLLUP_UPSERT = """
+insert or replace into daily_task_rollups (user_id, task_date, pending, completed, cancelled, completion_hours, reasons, refreshed_at)
+values (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+ANALYTICS_UPSERT = "insert or replace into user_behavior_analytics (user_id, analysis_date, analytics) values (?, ?, ?)"
+
+@instrument_class("db")
+class LocalTaskDatabase(TaskDatabase):
+    """Backend local em SQLite com as mesmas tabelas e métodos do TaskDatabase, sem acesso à rede"""
+    
+    def __init__(self, path: str = ":memory:", cache_size: int = 512):
+        self.path = path
+        super().__init__(cache_size)
+    
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.executescript(SCHEMA)
+    
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+    
+    def _write(self, sql: str, params=()) -> int:
+        with self._lock, self.conn:
+            return self.conn.execute(sql, params).rowcount
+    
+    def _write_many(self, sql: str, rows: List[tuple]) -> int:
+        with self._lock, self.conn:
+            return self.conn.executemany(sql, rows).rowcount
+    
+    def _fetch(self, query: Query) -> List[Dict]:
+        """Executa em SQL a mesma consulta que o TaskDatabase envia ao PostgREST (db_queries)"""
+        where, params = ["1 = 1"], []
+        for column, operator, value in query.filters:
+            if operator == "in":
+                values = value.strip("()").split(",")
+                where.append(f"{column} in ({', '.join('?' * len(values))})")
+                params += values
+            else:
+                where.append(f"{column} {SQL_OPERATORS[operator]} ?")
+                params.append(value)
+        if query.after:
+            (first, first_value), (second, second_value) = query.after
+            where.append(f"({first} > ? or ({first} = ? and {second} > ?))")
+            params += [first_value, first_value, second_value]
+        sql = f"select {', '.join(query.select.split(','))} from {query.table} where {' and '.join(where)}"
+        order = ", ".join(f"{column} desc" if desc else column for column, desc in query.orderings())
+        if order:
+            sql += f" order by {order}"
+        if query.limit:
+            sql += " limit ?"
+            params.append(query.limit)
+        return self._query(sql, params)
+    
+    def _get_task(self, task_id: str) -> Optional[Dict]:
+        rows = self._query("select * from tasks where id = ?", (task_id,))
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def _date_filters(user_id: int, start_date: Optional[date], end_date: Optional[date]):
+        sql = "user_id = ?"
+        params = [user_id]
+        if start_date:
+            sql += " and task_date >= ?"
+            params.append(start_date.isoformat())
+        if end_date:
+            sql += " and task_date <= ?"
+            params.append(end_date.isoformat())
+        return sql, params
+    
+    def add_task(self, user_id: int, task_description: str, task_date: date) -> Dict:
+        """Adiciona uma nova tarefa"""
+        task_id = str(uuid.uuid4())
+        with self._lock, self.conn:
+            self.conn.execute(
+                "insert into tasks (id, user_id, task_description, task_date, status, created_at) values (?, ?, ?, ?, 'pending', ?)",
+                (task_id, user_id, task_description, task_date.isoformat(), datetime.now().isoformat())
+            )
+            self._apply_analytics_delta(analytics_delta(user_id, task_date.isoformat(), "pending"))
+        task = self._get_task(task_id)
+        self._invalidate([user_id], TASK_READS)
+        return task
+    
+    def add_tasks(self, user_id: int, task_descriptions: List[str], task_date: date) -> List[Dict]:
+        """Adiciona várias tarefas numa única transação"""
+        if not task_descriptions:
+            return []
+        created_at = datetime.now().isoformat()
+        rows = [(str(uuid.uuid4()), user_id, description, task_date.isoformat(), created_at) for description in task_descriptions]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "insert into tasks (id, user_id, task_description, task_date, status, created_at) values (?, ?, ?, ?, 'pending', ?)",
+                rows
+            )
+            self._apply_analytics_delta(analytics_delta(user_id, task_date.isoformat(), "pending", count=len(rows)))
+        tasks = [self._get_task(row[0]) for row in rows]
+        self._invalidate([user_id], TASK_READS)
+        return tasks
+    
+    @cached_read
+    def get_daily_task_count(self, user_id: int, task_date: date) -> int:
+        """Retorna quantidade de tarefas do dia"""
+        rows = self._query(
+            "select count(*) as n from tasks where user_id = ? and task_date = ? and status = 'pending'",
+            (user_id, task_date.isoformat())
+        )
+        return rows[0]["n"]
+    
+    def complete_task(self, task_id: str) -> Dict:
+        """Marca tarefa como concluída"""
+        completed_at = datetime.now().isoformat()
+        return self._change_status(
+            task_id, "completed", "update tasks set status = 'completed', completed_at = ? where id = ?", (completed_at,),
+            completed_at=completed_at
+        )
+    
+    def cancel_task(self, task_id: str, reason: str) -> Dict:
+        """Cancela tarefa com justificativa"""
+        return self._change_status(
+            task_id, "cancelled", "update tasks set status = 'cancelled', cancellation_reason = ? where id = ?", (reason,),
+            reason=reason
+        )
+    
+    def _change_status(self, task_id: str, status: str, sql: str, params: tuple, **delta) -> Optional[Dict]:
+        """Atualiza o status e os agregados na mesma transação, como os gatilhos de tasks no Postgres"""
+        with self._lock, self.conn:
+            # Trava o banco já na leitura do status anterior, que decide a variação
+            self.conn.execute("begin immediate")
+            previous = self.conn.execute("select status from tasks where id = ?", (task_id,)).fetchone()
+            if previous is None:
+                return None
+            self.conn.execute(sql, (*params, task_id))
+            task = dict(self.conn.execute("select * from tasks where id = ?", (task_id,)).fetchone())
+            if previous["status"] != status:
+                self._apply_analytics_delta(analytics_delta(task["user_id"], task["task_date"], status, previous["status"], **delta))
+        self._invalidate([task["user_id"]], TASK_READS)
+        return task
+    
+    @cached_read
+    def get_dashboard_aggregates(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """Mesmo formato da RPC dashboard_task_aggregates, calculado no SQLite"""
+        where, params = self._date_filters(user_id, start_date, end_date)
+        by_day = self._query(
+            f"select task_date, status, count(*) as count from tasks where {where} group by task_date, status order by task_date, status",
+            params
+        )
+        by_hour = self._query(
+            f"""select cast(substr(completed_at, 12, 2) as integer) as hour, count(*) as count
+                from tasks where {where} and status = 'completed' and completed_at is not null
+                group by hour order by hour""",
+            params
+        )
+        reasons = self._query(
+            f"""select cancellation_reason as reason, count(*) as count
+                from tasks where {where} and status = 'cancelled' and cancellation_reason is not null
+                group by cancellation_reason order by count desc limit 5""",
+            params
+        )
+        return {"by_day": by_day, "by_hour": by_hour, "reasons": reasons}
+    
+    @cached_read
+    def get_daily_rollups(self, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None, page_size: int = 1000) -> List[Dict]:
+        """Contagens diárias pré-agregadas do usuário (uma linha por dia com tarefas), em ordem de data"""
+        where, params = self._date_filters(user_id, start_date, end_date)
+        rows = self._query(f"select {ROLLUP_COLUMNS} from daily_task_rollups where {where} order by task_date", params)
+        for row in rows:
+            row["completion_hours"] = json.loads(row["completion_hours"])
+            row["reasons"] = json.loads(row["reasons"])
+        return rows
+    
+    def refresh_daily_rollups(self, completed_since: Optional[str] = None, date_since: Optional[date] = None) -> Dict:
+        """Mesma atualização da RPC refresh_daily_task_rollups, com GROUP BY no SQLite"""
+        watermark = self._query(
+            "select max(completed_at) as watermark from tasks where completed_at >= ?", (completed_since or "",)
+        )[0]["watermark"] or completed_since
+        
+        filters, params = [], []
+        if date_since:
+            filters.append("task_date >= ?")
+            params.append(date_since.isoformat())
+        if completed_since:
+            filters.append("completed_at >= ?")
+            params.append(completed_since)
+        touched = f"with touched as (select distinct user_id, task_date from tasks where {' or '.join(filters) or '1 = 1'})"
+        
+        days: Dict[tuple, Dict] = {}
+        
+        def bucket(row: Dict) -> Dict:
+            return days.setdefault((row["user_id"], row["task_date"]), {"status": [0, 0, 0], "hours": [0] * 24, "reasons": {}})
+        
+        for row in self._query(
+            f"{touched} select t.user_id, t.task_date, t.status, count(*) as n from tasks t join touched using (user_id, task_date) group by 1, 2, 3",
+            params
+        ):
+            if row["status"] in STATUS_INDEX:
+                bucket(row)["status"][STATUS_INDEX[row["status"]]] = row["n"]
+        for row in self._query(
+            f"""{touched} select t.user_id, t.task_date, cast(substr(t.completed_at, 12, 2) as integer) as hour, count(*) as n
+                from tasks t join touched using (user_id, task_date)
+                where t.status = 'completed' and t.completed_at is not null group by 1, 2, 3""",
+            params
+        ):
+            bucket(row)["hours"][row["hour"]] = row["n"]
+        for row in self._query(
+            f"""{touched} select t.user_id, t.task_date, t.cancellation_reason as reason, count(*) as n
+                from tasks t join touched using (user_id, task_date)
+                where t.status = 'cancelled' and t.cancellation_reason is not null group by 1, 2, 3""",
+            params
+        ):
+            bucket(row)["reasons"][row["reason"]] = row["n"]
+        
+        refreshed_at = datetime.now().isoformat()
+        rows = [
+            (user_id, task_date, *day["status"], json.dumps(day["hours"]), json.dumps(day["reasons"]), refreshed_at)
+            for (user_id, task_date), day in days.items()
+        ]
+        with self._lock, self.conn:
+            if not filters:
+                self.conn.execute("delete from daily_task_rollups")
+            self.conn.executemany(ROLLUP_UPSERT, rows)
+        return {"rows": len(rows), "completed_watermark": watermark}
+    
+    def update_notification_settings(self, user_id: int, morning_time: time, reminder_time: time) -> Dict:
+        """Atualiza horários de notificação"""
+        self._write(SETTINGS_UPSERT, (user_id, morning_time.isoformat(), reminder_time.isoformat(), datetime.now().isoformat()))
+        self._invalidate([user_id], ["get_user_notification_settings"])
+        return self._query("select * from notification_settings where user_id = ?", (user_id,))[0]
+    
+    def update_notification_settings_bulk(self, times_by_user: Dict[int, tuple], batch_size: int = 500) -> int:
+        """Atualiza horários de notificação de vários usuários numa transação"""
+        adjusted_at = datetime.now().isoformat()
+        rows = [
+            (user_id, morning_time.isoformat(), reminder_time.isoformat(), adjusted_at)
+            for user_id, (morning_time, reminder_time) in times_by_user.items()
+        ]
+        self._write_many(SETTINGS_UPSERT, rows)
+        self._invalidate(times_by_user, ["get_user_notification_settings"])
+        return len(rows)
+    
+    def save_behavior_analytics(self, user_id: int, analytics: Dict) -> Dict:
+        """Salva análise de comportamento do usuário"""
+        analysis_date = date.today().isoformat()
+        self._write(ANALYTICS_UPSERT, (user_id, analysis_date, json.dumps(analytics)))
+        self._invalidate([user_id], ["get_latest_analytics"])
+        return {"user_id": user_id, "analysis_date": analysis_date, **analytics}
+    
+    def save_behavior_analytics_bulk(self, analytics_by_user: Dict[int, Dict], batch_size: int = 500) -> int:
+        """Salva análises de vários usuários numa transação"""
+        analysis_date = date.today().isoformat()
+        rows = [(user_id, analysis_date, json.dumps(analytics)) for user_id, analytics in analytics_by_user.items()]
+        self._write_many(ANALYTICS_UPSERT, rows)
+        self._invalidate(analytics_by_user, ["get_latest_analytics"])
+        return len(rows)
+    
+    @cached_read
+    def get_latest_analytics(self, user_id: int) -> Dict:
+        """Busca última análise de comportamento"""
+        rows = self._query(
+            "select user_id, analysis_date, analytics from user_behavior_analytics where user_id = ? order by analysis_date desc limit 1",
+            (user_id,)
+        )
+        if not rows:
+            return None
+        return {"user_id": rows[0]["user_id"], "analysis_date": rows[0]["analysis_date"], **json.loads(rows[0]["analytics"])}
+    
+    def get_analytics_state(self, user_id: int) -> Optional[UserAnalyticsState]:
+        """Busca os agregados incrementais do usuário"""
+        rows = self._query("select user_id, days from user_analytics_state where user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return UserAnalyticsState.from_row({"user_id": rows[0]["user_id"], "days": json.loads(rows[0]["days"])})
+    
+    def init_analytics_state(self, user_id: int, days_back: int = 30) -> UserAnalyticsState:
+        """Monta e grava os agregados do usuário, se ainda não existirem, na mesma transação da leitura das tarefas"""
+        with self._lock, self.conn:
+            # Trava o banco antes da varredura: nenhuma escrita entra entre a leitura e a gravação do estado
+            self.conn.execute("begin immediate")
+            row = self.conn.execute("select days from user_analytics_state where user_id = ?", (user_id,)).fetchone()
+            if row is not None:
+                return UserAnalyticsState.from_row({"user_id": user_id, "days": json.loads(row["days"])}, days_back)
+            state = self._scan_analytics_state(user_id, days_back)
+            self.conn.execute(
+                "insert into user_analytics_state (user_id, days, updated_at) values (?, ?, ?)",
+                (user_id, json.dumps(state.days), datetime.now().isoformat())
+            )
+        return state
+    
+    def _apply_analytics_delta(self, delta: Dict):
+        """Aplica uma variação de analytics_delta dentro da transação da escrita, como apply_analytics_delta no Postgres"""
+        row = self.conn.execute("select days from user_analytics_state where user_id = ?", (delta["p_user_id"],)).fetchone()
+        if row is None:
+            return
+        state = UserAnalyticsState(delta["p_user_id"], json.loads(row["days"]))
+        state.apply_delta(delta)
+        state.expire()
+        self.conn.execute(
+            "update user_analytics_state set days = ?, updated_at = ? where user_id = ?",
+            (json.dumps(state.days), datetime.now().isoformat(), state.user_id)
+        )
+    
+    def build_analytics_state(self, user_id: int, days_back: int = 30, chunk_size: int = 1000) -> UserAnalyticsState:
+        """Monta os agregados da janela com GROUP BY no SQLite, sem trazer as tarefas para o Python"""
+        with self._lock:
+            return self._scan_analytics_state(user_id, days_back)
+    
+    def _scan_analytics_state(self, user_id: int, days_back: int) -> UserAnalyticsState:
+        # Chamado com self._lock já tomado (e, em init_analytics_state, dentro da transação)
+        start_date = analytics_window_start(days_back).isoformat()
+        days: Dict[str, Dict] = {}
+        
+        def bucket(task_date: str) -> Dict:
+            return days.setdefault(task_date, {"status": [0, 0, 0], "hours": [0] * 24, "reasons": {}})
+        
+        for row in self.conn.execute(
+            "select task_date, status, count(*) as n from tasks where user_id = ? and task_date >= ? group by task_date, status",
+            (user_id, start_date)
+        ):
+            if row["status"] in STATUS_INDEX:
+                bucket(row["task_date"])["status"][STATUS_INDEX[row["status"]]] = row["n"]
+        for row in self.conn.execute(
+            """select task_date, cast(substr(completed_at, 12, 2) as integer) as hour, count(*) as n
+               from tasks where user_id = ? and task_date >= ? and status = 'completed' and completed_at is not null
+               group by task_date, hour""",
+            (user_id, start_date)
+        ):
+            bucket(row["task_date"])["hours"][row["hour"]] = row["n"]
+        for row in self.conn.execute(
+            """select task_date, cancellation_reason as reason, count(*) as n
+               from tasks where user_id = ? and task_date >= ? and status = 'cancelled' and cancellation_reason is not null
+               group by task_date, cancellation_reason""",
+            (user_id, start_date)
+        ):
+            bucket(row["task_date"])["reasons"][row["reason"]] = row["n"]
+        
+        state = UserAnalyticsState(user_id, days, window_days=days_back)
+        state.expire()
+        return state
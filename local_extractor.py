@@ -0,0 +1,126 @@
+import re
+from typing import List, Tuple
+
+MAX_TASKS = 5
+
+# Itens de lista: "- comprar pão", "• ligar", "1. pagar", "2) enviar"
+BULLET_RE = re.compile(r"^\s*(?:[-*•▪–]|\d{1,2}[.)-]|\[\s?\])\s*")
+SEPARATOR_RE = re.compile(r"(\s*[,;]\s*(?:e\s+)?|\s+e\s+)")
+FILLER_RE = re.compile(
+    r"^(?:(?:oi|olá|ola|bom dia|boa tarde|boa noite)[,!.]?\s+)?"
+    r"(?:(?:hoje|amanhã|amanha|depois)\s+)?"
+    r"(?:(?:eu\s+)?(?:preciso|tenho|vou|quero|devo|não posso esquecer|nao posso esquecer|não esquecer|nao esquecer|lembrar|me lembra|me lembre)"
+    r"(?:\s+(?:de|que|do|da))?\s+)?"
+    r"(?:(?:hoje|amanhã|amanha|depois)\s+)?",
+    re.IGNORECASE
+)
+# Palavras que indicam frase subordinada ou dúvida: aqui o modelo entende melhor
+AMBIGUOUS_RE = re.compile(r"\b(?:porque|pois|quando|se|mas|talvez|acho|será|sera|caso|ou)\b|\?", re.IGNORECASE)
+NO_TASK_MESSAGES = {"oi", "olá", "ola", "ok", "obrigado", "obrigada", "valeu", "bom dia", "boa tarde", "boa noite", "tchau"}
+
+# Imperativos frequentes que não terminam como infinitivo
+IMPERATIVES = {
+    "compra", "compre", "liga", "ligue", "manda", "mande", "paga", "pague", "faz", "faça", "faca", "marca", "marque",
+    "envia", "envie", "leva", "leve", "busca", "busque", "lava", "lave", "limpa", "limpe", "estuda", "estude",
+    "agenda", "agende", "arruma", "arrume", "responde", "responda", "revisa", "revise", "escreve", "escreva",
+    "passa", "passe", "pega", "pegue", "vai", "vá", "va", "renova", "renove", "entrega", "entregue", "resolve", "resolva",
+}
+# Infinitivos de tarefas do dia a dia. Uma lista explícita em vez de regra por terminação:
+# "celular", "açúcar" e "computador" terminam em -ar/-or e não são verbos
+INFINITIVES = frozenset("""
+    abastecer abrir acabar acessar acompanhar acordar adiantar agendar ajeitar ajudar ajustar alimentar almoçar alongar
+    alterar alugar analisar anotar apagar aplicar aprender apresentar arquivar arrumar assinar assistir atender
+    atualizar avisar baixar banhar beber buscar cadastrar calcular caminhar cancelar carregar casar chamar checar
+    colocar combinar comemorar comer começar comparar comprar concluir conectar conferir configurar confirmar consertar
+    consultar contar contratar conversar convidar copiar correr corrigir cortar costurar cozinhar criar cuidar cumprir
+    decidir declarar deixar deletar depositar descansar descongelar desenhar desligar devolver digitar dirigir discutir
+    divulgar doar dobrar dormir editar emitir encerrar encomendar encontrar ensaiar ensinar entrar entregar enviar
+    enxugar escolher escovar escrever escutar estacionar estender estudar esvaziar excluir experimentar falar faxinar
+    fazer fechar finalizar fotografar gravar guardar imprimir incluir instalar jantar jogar juntar lanchar lavar lembrar
+    levantar levar ligar limpar malhar mandar marcar medir meditar montar mudar nadar negociar olhar orar organizar
+    ouvir pagar parcelar participar passar passear pedir pegar pendurar pensar pentear perguntar pesquisar pintar
+    planejar plantar postar praticar preencher preparar procurar programar publicar quitar receber reciclar recolher
+    regar registrar reler remarcar renovar reservar resolver responder retirar reunir rever revisar sacar sair secar
+    separar servir solicitar subir tentar terminar tirar tocar tomar trabalhar trancar transferir trazer treinar trocar
+    usar vacinar varrer vender verificar vestir viajar visitar votar
+    dar ir ler pôr rir ser ter ver vir
+""".split())
+
+def _is_verb(word: str) -> bool:
+    # Pronome ligado ao infinitivo: "arrumar-se", "lembrar-me"
+    base = word.split("-", 1)[0]
+    return word in IMPERATIVES or base in INFINITIVES
+
+def _starts_with_verb(text: str) -> bool:
+    words = text.split(maxsplit=1)
+    return bool(words) and _is_verb(words[0].lower().strip(".,;:!"))
+
+def _clean(task: str) -> str:
+    task = FILLER_RE.sub("", task.strip()).strip(" .!;,:")
+    return task[:1].upper() + task[1:]
+
+def _split_line(line: str) -> Tuple[List[str], bool]:
+    """Divide por vírgula, ponto e vírgula e "e", juntando de volta (com o separador original) partes que não começam com verbo.
+    
+    Devolve também se alguma parte juntada veio depois de vírgula: "comprar arroz, açúcar e café" é uma lista de
+    itens que o modelo pode entender como uma tarefa ou várias.
+    """
+    pieces = SEPARATOR_RE.split(line)
+    parts, enumeration = [], False
+    for separator, part in zip([""] + pieces[1::2], pieces[0::2]):
+        part = part.strip()
+        if not part:
+            continue
+        if parts and not _starts_with_verb(FILLER_RE.sub("", part)):
+            # "comprar pão e leite": "leite" continua a tarefa anterior
+            parts[-1] = f"{parts[-1]}{separator}{part}"
+            enumeration = enumeration or separator.strip().startswith((",", ";"))
+        else:
+            parts.append(part)
+    return parts, enumeration
+
+def extract_tasks_locally(user_message: str) -> Tuple[List[str], float]:
+    """Extrai tarefas de listas simples sem chamar o modelo; devolve (tarefas, confiança 0-1)"""
+    message = (user_message or "").strip()
+    if not message:
+        return [], 1.0
+    if message.lower().strip(" .!") in NO_TASK_MESSAGES:
+        return [], 0.9
+    
+    lines = [line for line in message.splitlines() if line.strip()]
+    bullet_lines = [line for line in lines if BULLET_RE.match(line)]
+    
+    # Lista com marcadores: cada item é uma tarefa
+    if len(bullet_lines) >= 2 and len(bullet_lines) >= len(lines) - 1:
+        tasks = [_clean(BULLET_RE.sub("", line)) for line in bullet_lines]
+        tasks = [task for task in tasks if task]
+        # "- pão / - leite" é lista de compras: o modelo completa melhor o verbo
+        confidence = 0.95 if all(_starts_with_verb(task) for task in tasks) else 0.7
+        if len(tasks) > MAX_TASKS or any(AMBIGUOUS_RE.search(task) for task in tasks):
+            confidence -= 0.3
+        return tasks[:MAX_TASKS], confidence
+    
+    # Várias linhas sem marcador, uma tarefa por linha
+    if len(lines) > 1:
+        tasks = [_clean(line) for line in lines]
+        if all(_starts_with_verb(task) for task in tasks) and not any(AMBIGUOUS_RE.search(line) for line in lines):
+            return tasks[:MAX_TASKS], 0.9 if len(tasks) <= MAX_TASKS else 0.6
+        return tasks[:MAX_TASKS], 0.3
+    
+    line = lines[0]
+    if len(line) > 200 or AMBIGUOUS_RE.search(line):
+        return [], 0.1
+    
+    stripped = FILLER_RE.sub("", line).strip()
+    parts, enumeration = _split_line(stripped)
+    tasks = [_clean(part) for part in parts]
+    tasks = [task for task in tasks if task]
+    if not tasks:
+        return [], 0.1
+    if not all(_starts_with_verb(task) for task in tasks):
+        return tasks[:MAX_TASKS], 0.3
+    if len(tasks) > MAX_TASKS:
+        return tasks[:MAX_TASKS], 0.6
+    if enumeration:
+        return tasks, 0.7
+    return tasks, 0.9
@@ -0,0 +1,318 @@
+import asyncio
+import bisect
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+# Limites (segundos) dos buckets do histograma de latência
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "cerebro"
+
+# Spans da requisição atual (None fora de um trace) e span em execução, para atribuir bytes e cache
+_trace: ContextVar[Optional[List[Dict]]] = ContextVar("trace", default=None)
+_span: ContextVar[Optional[Dict]] = ContextVar("span", default=None)
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa pelo limite superior do bucket que contém o quantil"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+class MetricsRegistry:
+    """Latências, volumes, cache e tokens por operação, agregados em memória no processo"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, component: str, operation: str, seconds: float):
+        with self._lock:
+            histogram = self.latency.get((component, operation))
+            if histogram is None:
+                histogram = self.latency[(component, operation)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+    
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+    
+    def snapshot(self) -> List[Dict]:
+        """Uma linha por operação, para o painel de depuração"""
+        with self._lock:
+            rows = {
+                key: {
+                    "component": key[0], "operation": key[1], "calls": histogram.count,
+                    "avg_ms": round(histogram.sum / histogram.count * 1000, 2),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 2),
+                }
+                for key, histogram in self.latency.items()
+            }
+            for (name, labels), value in self.counters.items():
+                labels = dict(labels)
+                key = (labels.get("component", labels.get("cache")), labels.get("operation"))
+                if key not in rows:
+                    continue
+                if name == "tokens":
+                    column = f"{labels['kind']}_tokens"
+                elif name == "cache_requests":
+                    column = "cache_hits" if labels["result"] == "hit" else "cache_misses"
+                else:
+                    column = name
+                rows[key][column] = rows[key].get(column, 0) + value
+            return sorted(rows.values(), key=lambda row: (row["component"], row["operation"]))
+    
+    def to_prometheus(self) -> str:
+        """Exporta tudo no formato texto de exposição do Prometheus"""
+        lines = []
+        with self._lock:
+            name = f"{PREFIX}_operation_seconds"
+            lines += [f"# HELP {name} Latência das operações", f"# TYPE {name} histogram"]
+            for (component, operation), histogram in sorted(self.latency.items()):
+                labels = f'component="{component}",operation="{operation}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            
+            declared = set()
+            for (counter, labels), value in sorted(self.counters.items()):
+                name = f"{PREFIX}_{counter}_total"
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f"{name}{{{rendered}}} {value}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+metrics = MetricsRegistry()
+
+def payload_rows(result: Any) -> int:
+    """Linhas de um resultado: tamanho da lista, ou da maior coluna num lote colunar"""
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        lengths = [len(value) for value in result.values() if isinstance(value, list)]
+        return max(lengths) if lengths else 1
+    return 1
+
+def start_trace() -> List[Dict]:
+    """Começa um trace no contexto atual; as operações seguintes acrescentam spans à lista devolvida"""
+    spans: List[Dict] = []
+    _trace.set(spans)
+    return spans
+
+@contextmanager
+def trace():
+    """Coleta os spans das operações executadas dentro do bloco"""
+    spans: List[Dict] = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+async def carry_trace(coroutine: Awaitable, spans: Optional[List[Dict]]) -> Any:
+    """Executa a corrotina dentro do trace de outra thread (ex.: EventLoopThread)"""
+    token = _trace.set(spans)
+    try:
+        return await coroutine
+    finally:
+        _trace.reset(token)
+
+def current_trace() -> Optional[List[Dict]]:
+    return _trace.get()
+
+@contextmanager
+def span(component: str, operation: str):
+    """Mede uma operação: latência no histograma, erros, e um span no trace ativo"""
+    record = {"component": component, "operation": operation, "rows": None, "bytes": 0, "cache": None, "error": None}
+    token = _span.set(record)
+    start = time.perf_counter()
+    raised = False
+    try:
+        yield record
+    except BaseException as e:
+        if not isinstance(e, (GeneratorExit, StopIteration, StopAsyncIteration)):
+            record["error"] = repr(e)
+            raised = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _span.reset(token)
+        metrics.observe(component, operation, seconds)
+        if raised:
+            metrics.inc("errors", component=component, operation=operation)
+        if record["rows"]:
+            metrics.inc("rows", record["rows"], component=component, operation=operation)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append({**record, "ms": round(seconds * 1000, 3), "started_at": start})
+
+def instrumented(component: str, operation: Optional[str] = None):
+    """Decorador que mede funções, corrotinas e geradores (cada item gerado vira uma observação)"""
+    def decorator(func):
+        name = operation or func.__name__
+        
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                iterator = func(*args, **kwargs).__aiter__()
+                while True:
+                    with span(component, name) as record:
+                        try:
+                            item = await iterator.__anext__()
+                        except StopAsyncIteration:
+                            return
+                        record["rows"] = payload_rows(item)
+                    yield item
+            return async_gen_wrapper
+        
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                iterator = iter(func(*args, **kwargs))
+                while True:
+                    with span(component, name) as record:
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        record["rows"] = payload_rows(item)
+                    yield item
+            return gen_wrapper
+        
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(component, name) as record:
+                    result = await func(*args, **kwargs)
+                    record["rows"] = payload_rows(result)
+                    return result
+            return async_wrapper
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(component, name) as record:
+                result = func(*args, **kwargs)
+                record["rows"] = payload_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+def instrument_class(component: str):
+    """Aplica @instrumented a todos os métodos públicos definidos na própria classe"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_"):
+                continue
+            if isinstance(value, staticmethod):
+                setattr(cls, attr, staticmethod(instrumented(component, attr)(value.__func__)))
+            elif inspect.isfunction(value):
+                setattr(cls, attr, instrumented(component, attr)(value))
+        return cls
+    return decorator
+
+def record_cache(cache: str, operation: str, hit: bool):
+    """Conta acerto/falta de cache e marca o span em execução"""
+    metrics.inc("cache_requests", cache=cache, operation=operation, result="hit" if hit else "miss")
+    record = _span.get()
+    if record is not None:
+        record["cache"] = "hit" if hit else "miss"
+
+def record_bytes(size: int):
+    """Soma bytes recebidos à operação em execução"""
+    record = _span.get()
+    if record is None:
+        return
+    record["bytes"] += size
+    metrics.inc("bytes", size, component=record["component"], operation=record["operation"])
+
+def record_error(component: str, operation: str, error: BaseException):
+    """Conta erros tratados (que não sobem como exceção) e marca o span em execução"""
+    metrics.inc("errors", component=component, operation=operation)
+    record = _span.get()
+    if record is not None:
+        record["error"] = repr(error)
+
+def record_llm_usage(operation: str, response: Any):
+    """Soma os tokens de entrada e saída informados em usage_metadata pela resposta do Gemini"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            metrics.inc("tokens", count, component="llm", operation=operation, kind=kind)
+
+def httpx_event_hooks(is_async: bool = False) -> Dict[str, list]:
+    """Hooks do httpx que contam os bytes de cada resposta na operação em execução"""
+    if is_async:
+        async def on_response(response):
+            await response.aread()
+            record_bytes(len(response.content))
+    else:
+        def on_response(response):
+            response.read()
+            record_bytes(len(response.content))
+    return {"response": [on_response]}
+
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """Serve /metrics (qualquer caminho) numa thread, para o Prometheus coletar dos serviços"""
+    # Importado aqui: só os serviços que expõem métricas pagam pelo http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
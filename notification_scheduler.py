@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import heapq
+from datetime import datetime, time, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import TELEGRAM_BOT_TOKEN
+from database import TaskDatabase
+from storage import create_database
+from metrics import instrumented, record_error, start_metrics_server
+from rate_limit import TokenBucket
+
+MORNING = "morning"
+REMINDER = "reminder"
+SETTING_COLUMNS = {MORNING: "morning_notification_time", REMINDER: "reminder_notification_time"}
+
+def morning_message() -> str:
+    return "☀️ Bom dia! Quais são suas tarefas para hoje? Me mande a lista que eu organizo."
+
+def reminder_message(tasks: List[Dict]) -> str:
+    lines = "\n".join(f"• {task['task_description']}" for task in tasks)
+    return f"⏰ Você ainda tem {len(tasks)} tarefa(s) pendente(s) hoje:\n{lines}"
+
+def next_fire(at: time, now: datetime) -> datetime:
+    """Próxima ocorrência do horário: hoje se ainda não passou, senão amanhã"""
+    fire_at = datetime.combine(now.date(), at)
+    return fire_at if fire_at > now else fire_at + timedelta(days=1)
+
+class FakeSender:
+    """Sender local que só guarda as mensagens, para testes e execuções sem Telegram"""
+    
+    def __init__(self, echo: bool = False):
+        self.echo = echo
+        self.sent: List[Tuple[int, str]] = []
+    
+    async def send(self, chat_id: int, text: str):
+        self.sent.append((chat_id, text))
+        if self.echo:
+            print(f"[{chat_id}] {text}")
+    
+    async def aclose(self):
+        pass
+
+class TelegramSender:
+    """Envia mensagens pela Bot API com conexões keep-alive, respeitando o limite global do Telegram"""
+    
+    def __init__(self, token: Optional[str] = None, messages_per_second: float = 25, max_connections: int = 50, timeout: float = 10.0):
+        self.limiter = TokenBucket(messages_per_second * 60, capacity=messages_per_second)
+        self.http = httpx.AsyncClient(
+            base_url=f"https://api.telegram.org/bot{token or TELEGRAM_BOT_TOKEN}",
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout
+        )
+    
+    @staticmethod
+    def retry_after(response: httpx.Response) -> float:
+        """Segundos pedidos pelo Telegram num 429 (1 se a resposta não trouxer o valor)"""
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, TypeError, KeyError):
+            return 1.0
+    
+    @instrumented("scheduler", "telegram.send")
+    async def send(self, chat_id: int, text: str, attempts: int = 2):
+        for attempt in range(attempts):
+            await self.limiter.acquire()
+            response = await self.http.post("/sendMessage", json={"chat_id": chat_id, "text": text})
+            # Excedeu o limite na última tentativa: falha já, sem segurar a vaga de envio esperando à toa
+            if response.status_code != 429 or attempt == attempts - 1:
+                break
+            # Excedeu o limite: o Telegram informa quanto esperar
+            await asyncio.sleep(self.retry_after(response))
+        response.raise_for_status()
+    
+    async def aclose(self):
+        await self.http.aclose()
+
+class NotificationScheduler:
+    """Dispara as notificações de notification_settings a partir de um min-heap com o próximo disparo de cada usuário.
+    
+    O banco é lido só para atualizar as linhas alteradas (last_adjusted_at) e, a cada minuto, para buscar
+    de uma vez as tarefas pendentes de todos os usuários com lembrete vencido.
+    """
+    
+    def __init__(self, db: TaskDatabase, sender, refresh_interval: float = 60, full_reload_interval: float = 3600,
+                 concurrency: int = 100, overlap: float = 300, clock: Callable[[], datetime] = datetime.now):
+        self.db = db
+        self.sender = sender
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.concurrency = concurrency
+        # Margem (segundos) antes do watermark: linhas carimbadas antes dele mas gravadas por transações
+        # ainda abertas na última leitura; horários inalterados relidos não geram novas entradas
+        self.overlap = overlap
+        self.clock = clock
+        self.heap: List[Tuple[datetime, int, str]] = []
+        # Horário e próximo disparo vigentes de cada (usuário, tipo); entradas do heap que não batem são descartadas ao sair
+        self.scheduled: Dict[Tuple[int, str], Tuple[time, datetime]] = {}
+        self.watermark: Optional[str] = None
+        self.sent = 0
+        self.failed = 0
+    
+    def apply_settings(self, rows: List[Dict], now: Optional[datetime] = None) -> int:
+        """Agenda os horários das linhas lidas; horários inalterados não geram novas entradas"""
+        now = now or self.clock()
+        changed = 0
+        for row in rows:
+            for kind, column in SETTING_COLUMNS.items():
+                value = row.get(column)
+                key = (row["user_id"], kind)
+                at = time.fromisoformat(value) if value else None
+                current = self.scheduled.get(key)
+                if at == (current[0] if current else None):
+                    continue
+                changed += 1
+                if at is None:
+                    del self.scheduled[key]
+                    continue
+                self._schedule(key, at, now)
+            adjusted_at = row.get("last_adjusted_at")
+            if adjusted_at and (self.watermark is None or adjusted_at > self.watermark):
+                self.watermark = adjusted_at
+        return changed
+    
+    def updated_since(self) -> Optional[str]:
+        if self.watermark is None:
+            return None
+        return (datetime.fromisoformat(self.watermark) - timedelta(seconds=self.overlap)).isoformat()
+    
+    @instrumented("scheduler")
+    def refresh(self, full: bool = False) -> int:
+        """Lê as configurações alteradas desde a última leitura (ou todas, na recarga completa)"""
+        now = self.clock()
+        seen, changed = set(), 0
+        for page in self.db.iter_notification_settings(updated_since=None if full else self.updated_since()):
+            changed += self.apply_settings(page, now)
+            seen.update(row["user_id"] for row in page)
+        if full:
+            # Linhas removidas da tabela só aparecem na recarga completa
+            for key in [key for key in self.scheduled if key[0] not in seen]:
+                del self.scheduled[key]
+                changed += 1
+        return changed
+    
+    def _schedule(self, key: Tuple[int, str], at: time, now: datetime):
+        fire_at = next_fire(at, now)
+        self.scheduled[key] = (at, fire_at)
+        heapq.heappush(self.heap, (fire_at, *key))
+    
+    def pop_due(self, now: datetime) -> Dict[str, List[int]]:
+        """Retira do heap os disparos vencidos e reagenda cada um para o dia seguinte"""
+        due = {MORNING: [], REMINDER: []}
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, user_id, kind = heapq.heappop(self.heap)
+            current = self.scheduled.get((user_id, kind))
+            if current is None or current[1] != fire_at:
+                continue
+            due[kind].append(user_id)
+            self._schedule((user_id, kind), current[0], now)
+        return due
+    
+    @instrumented("scheduler")
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """Envia as notificações vencidas; lembretes só vão para quem tem tarefa pendente hoje"""
+        now = now or self.clock()
+        due = self.pop_due(now)
+        messages = [(user_id, morning_message()) for user_id in due[MORNING]]
+        if due[REMINDER]:
+            tasks_by_user = await asyncio.to_thread(self.db.get_pending_tasks_bulk, due[REMINDER], now.date())
+            messages += [(user_id, reminder_message(tasks_by_user[user_id])) for user_id in due[REMINDER] if tasks_by_user.get(user_id)]
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def send(chat_id: int, text: str):
+            async with semaphore:
+                try:
+                    await self.sender.send(chat_id, text)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    record_error("scheduler", "send", e)
+                    print(f"Erro ao notificar {chat_id}: {e}")
+        
+        await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages))
+        return len(messages)
+    
+    async def run(self):
+        """Laço do serviço: atualiza as configurações periodicamente e dispara no início de cada minuto"""
+        last_refresh = last_full_reload = None
+        while True:
+            now = self.clock()
+            if last_full_reload is None or (now - last_full_reload).total_seconds() >= self.full_reload_interval:
+                await asyncio.to_thread(self.refresh, True)
+                last_refresh = last_full_reload = now
+            elif (now - last_refresh).total_seconds() >= self.refresh_interval:
+                await asyncio.to_thread(self.refresh)
+                last_refresh = now
+            
+            await self.tick()
+            next_minute = (self.clock() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+            await asyncio.sleep(max(0.0, (next_minute - self.clock()).total_seconds()))
+
+async def serve(sender, refresh_interval: float, concurrency: int):
+    scheduler = NotificationScheduler(create_database(), sender, refresh_interval=refresh_interval, concurrency=concurrency)
+    try:
+        await scheduler.run()
+    finally:
+        await sender.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia as notificações de manhã e de lembrete de todos os usuários")
+    parser.add_argument("--refresh-interval", type=float, default=60, help="Segundos entre leituras das configurações alteradas")
+    parser.add_argument("--concurrency", type=int, default=100, help="Envios simultâneos ao Telegram")
+    parser.add_argument("--dry-run", action="store_true", help="Não envia nada, só mostra as mensagens no terminal")
+    parser.add_argument("--metrics-port", type=int, help="Expõe as métricas no formato do Prometheus nesta porta")
+    args = parser.parse_args()
+    
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    sender = FakeSender(echo=True) if args.dry_run else TelegramSender()
+    asyncio.run(serve(sender, args.refresh_interval, args.concurrency))
+
+if __name__ == "__main__":
+    main()
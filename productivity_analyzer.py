@@ -1,96 +1,93 @@
+import asyncio
 from database import TaskDatabase
+from metrics import instrument_class
+from storage import get_database
+from analytics_state import UserAnalyticsState
 from datetime import datetime, timedelta, date, time
-import pandas as pd
 import numpy as np
-from typing import Dict
+from typing import Dict, List, Optional
+from task_metrics import (
+    CANCELLED, best_and_worst_day, best_and_worst_hour, completion_rate_percent, hourly_completion_counts, most_common_reason,
+    productivity_score, weekday_completion_rates, weekday_status_counts
+)
+from task_table import TaskTable
 
+@instrument_class("analyzer")
 class ProductivityAnalyzer:
-    def __init__(self):
-        self.db = TaskDatabase()
+    def __init__(self, db: Optional[TaskDatabase] = None):
+        self._db = db
     
-    def analyze_best_completion_hours(self, user_id: int, days_back: int = 30) -> Dict:
-        """Analisa os melhores horários de conclusão de tarefas"""
+    @property
+    def db(self) -> TaskDatabase:
+        """Cria o cliente do banco só quando for necessário"""
+        if self._db is None:
+            self._db = get_database()
+        return self._db
+    
+    def load_task_table(self, user_id: int, days_back: int = 30) -> TaskTable:
+        """Busca a janela de tarefas uma única vez, já em colunas compactas (compartilhada pelo cache de leituras)"""
         start_date = date.today() - timedelta(days=days_back)
-        tasks = self.db.get_tasks_for_dashboard(user_id, start_date)
-        
-        df = pd.DataFrame(tasks)
-        if df.empty:
-            return {"best_hour": 8, "worst_hour": 18}
-        
-        completed = df[df['status'] == 'completed'].copy()
-        if completed.empty:
+        return self.db.get_task_table(user_id, start_date)
+    
+    @staticmethod
+    def build_task_table(tasks: List[Dict]) -> TaskTable:
+        """Converte as linhas do banco numa TaskTable"""
+        return TaskTable.from_rows(tasks)
+    
+    def _window(self, user_id: int, days_back: int, table: Optional[TaskTable]) -> TaskTable:
+        """Recorta a janela de dias pedida a partir da tabela compartilhada"""
+        if table is None:
+            return self.load_task_table(user_id, days_back)
+        return table.since(date.today() - timedelta(days=days_back))
+    
+    def analyze_best_completion_hours(self, user_id: int, days_back: int = 30, table: Optional[TaskTable] = None) -> Dict:
+        """Analisa os melhores horários de conclusão de tarefas"""
+        table = self._window(user_id, days_back, table)
+        if not len(table):
             return {"best_hour": 8, "worst_hour": 18}
         
-        completed['completed_at'] = pd.to_datetime(completed['completed_at'])
-        completed['hour'] = completed['completed_at'].dt.hour
-        
-        hourly_counts = completed.groupby('hour').size()
-        
-        if len(hourly_counts) == 0:
+        hourly = hourly_completion_counts(table)
+        extremes = best_and_worst_hour(hourly)
+        if extremes is None:
             return {"best_hour": 8, "worst_hour": 18}
         
-        best_hour = int(hourly_counts.idxmax())
-        worst_hour = int(hourly_counts.idxmin())
+        best_hour, worst_hour = extremes
         
         return {
             "best_hour": best_hour,
             "worst_hour": worst_hour,
-            "hourly_distribution": hourly_counts.to_dict()
+            "hourly_distribution": {int(hour): int(hourly[hour]) for hour in np.flatnonzero(hourly)}
         }
     
-    def analyze_best_days(self, user_id: int, days_back: int = 30) -> Dict:
+    def analyze_best_days(self, user_id: int, days_back: int = 30, table: Optional[TaskTable] = None) -> Dict:
         """Analisa os melhores dias da semana"""
-        start_date = date.today() - timedelta(days=days_back)
-        tasks = self.db.get_tasks_for_dashboard(user_id, start_date)
-        
-        df = pd.DataFrame(tasks)
-        if df.empty:
+        table = self._window(user_id, days_back, table)
+        if not len(table):
             return {"best_day": 1, "worst_day": 5}
         
-        df['task_date'] = pd.to_datetime(df['task_date'])
-        df['day_of_week'] = df['task_date'].dt.dayofweek
-        
-        completion_by_day = df.groupby('day_of_week').apply(
-            lambda x: (x['status'] == 'completed').sum() / len(x) if len(x) > 0 else 0
-        )
+        completion_by_day = weekday_completion_rates(weekday_status_counts(table))
         
-        if len(completion_by_day) == 0:
+        extremes = best_and_worst_day(completion_by_day)
+        if extremes is None:
             return {"best_day": 1, "worst_day": 5}
         
-        best_day = int(completion_by_day.idxmax())
-        worst_day = int(completion_by_day.idxmin())
+        best_day, worst_day = extremes
         
         return {
             "best_day": best_day,
             "worst_day": worst_day,
-            "daily_completion_rates": completion_by_day.to_dict()
+            "daily_completion_rates": completion_by_day
         }
     
-    def calculate_productivity_score(self, user_id: int, days_back: int = 7) -> float:
+    def calculate_productivity_score(self, user_id: int, days_back: int = 7, table: Optional[TaskTable] = None) -> float:
         """Calcula score de produtividade (0-100)"""
-        start_date = date.today() - timedelta(days=days_back)
-        tasks = self.db.get_tasks_for_dashboard(user_id, start_date)
-        
-        df = pd.DataFrame(tasks)
-        if df.empty:
-            return 50.0
-        
-        completion_rate = (df['status'] == 'completed').sum() / len(df)
-        cancellation_rate = (df['status'] == 'cancelled').sum() / len(df)
-        
-        df['task_date'] = pd.to_datetime(df['task_date'])
-        unique_days = df['task_date'].dt.date.nunique()
-        consistency_bonus = min(unique_days / days_back, 1.0) * 20
-        
-        base_score = completion_rate * 60
-        penalty = cancellation_rate * 20
-        score = min(base_score - penalty + consistency_bonus, 100)
-        
-        return round(score, 2)
+        table = self._window(user_id, days_back, table)
+        return productivity_score(table.status_counts(), len(table), len(np.unique(table.day)), days_back)
     
-    def calculate_optimal_reminder_time(self, user_id: int) -> time:
+    def calculate_optimal_reminder_time(self, user_id: int, hour_analysis: Optional[Dict] = None) -> time:
         """Calcula horário ótimo para lembrete baseado no pior horário"""
-        hour_analysis = self.analyze_best_completion_hours(user_id)
+        if hour_analysis is None:
+            hour_analysis = self.analyze_best_completion_hours(user_id)
         worst_hour = hour_analysis['worst_hour']
         
         optimal_hour = max(worst_hour - 2, 14)
@@ -98,56 +95,103 @@ class ProductivityAnalyzer:
         
         return time(hour=optimal_hour, minute=0)
     
-    def analyze_cancellation_patterns(self, user_id: int, days_back: int = 30) -> Dict:
+    def analyze_cancellation_patterns(self, user_id: int, days_back: int = 30, table: Optional[TaskTable] = None) -> Dict:
         """Analisa padrões de cancelamento"""
-        start_date = date.today() - timedelta(days=days_back)
-        tasks = self.db.get_tasks_for_dashboard(user_id, start_date)
-        
-        df = pd.DataFrame(tasks)
-        cancelled = df[df['status'] == 'cancelled']
-        
-        if cancelled.empty:
-            return {"most_common_reason": "Nenhum cancelamento"}
+        table = self._window(user_id, days_back, table)
+        total_cancellations = int(table.status_counts()[CANCELLED])
+        most_common = most_common_reason(total_cancellations, table.reason_counts())
         
-        reason_counts = cancelled['cancellation_reason'].value_counts()
-        most_common = reason_counts.index[0] if len(reason_counts) > 0 else "N/A"
+        if not total_cancellations:
+            return {"most_common_reason": most_common}
         
         return {
             "most_common_reason": most_common,
-            "total_cancellations": len(cancelled),
-            "cancellation_rate": len(cancelled) / len(df)
+            "total_cancellations": total_cancellations,
+            "cancellation_rate": total_cancellations / len(table)
         }
     
-    def run_full_analysis(self, user_id: int) -> Dict:
-        """Executa análise completa e salva no banco"""
-        hours = self.analyze_best_completion_hours(user_id)
-        days = self.analyze_best_days(user_id)
-        score = self.calculate_productivity_score(user_id)
-        optimal_time = self.calculate_optimal_reminder_time(user_id)
-        cancellations = self.analyze_cancellation_patterns(user_id)
-        
-        start_date = date.today() - timedelta(days=30)
-        tasks = self.db.get_tasks_for_dashboard(user_id, start_date)
-        df = pd.DataFrame(tasks)
+    def compute_analytics(self, user_id: int, table: TaskTable, days_back: int = 30) -> Dict:
+        """Calcula todas as métricas a partir de uma tabela com a janela de days_back dias, sem acessar o banco"""
+        table = self._window(user_id, days_back, table)
+        hours = self.analyze_best_completion_hours(user_id, days_back, table=table)
+        days = self.analyze_best_days(user_id, days_back, table=table)
+        # O score mede a última semana (ou a janela inteira, se for menor)
+        score = self.calculate_productivity_score(user_id, min(7, days_back), table=table)
+        optimal_time = self.calculate_optimal_reminder_time(user_id, hour_analysis=hours)
+        cancellations = self.analyze_cancellation_patterns(user_id, days_back, table=table)
+        
+        avg_completion = completion_rate_percent(table.status_counts(), len(table))
         
-        avg_completion = 0.0
-        if not df.empty:
-            avg_completion = (df['status'] == 'completed').sum() / len(df) * 100
-        
-        analytics = {
+        return {
             "best_completion_hour": hours['best_hour'],
             "worst_completion_hour": hours['worst_hour'],
             "best_day_of_week": days['best_day'],
             "worst_day_of_week": days['worst_day'],
-            "avg_completion_rate": round(avg_completion, 2),
+            "avg_completion_rate": avg_completion,
             "most_common_cancellation_reason": cancellations['most_common_reason'],
             "optimal_reminder_time": optimal_time.isoformat(),
             "productivity_score": score
         }
+    
+    def analyze_from_state(self, user_id: int, state: UserAnalyticsState) -> Dict:
+        """Calcula as mesmas métricas de compute_analytics lendo apenas os agregados, com as mesmas fórmulas"""
+        best_hour, worst_hour = best_and_worst_hour(state.hourly_counts(30)) or (8, 18)
+        best_day, worst_day = best_and_worst_day(weekday_completion_rates(state.weekday_status_counts(30))) or (1, 5)
+        
+        recent = state.status_counts(7)
+        score = productivity_score(recent, sum(recent), state.active_days(7), 7)
+        
+        status_counts = state.status_counts(30)
+        optimal_time = self.calculate_optimal_reminder_time(user_id, hour_analysis={"worst_hour": worst_hour})
+        
+        return {
+            "best_completion_hour": best_hour,
+            "worst_completion_hour": worst_hour,
+            "best_day_of_week": best_day,
+            "worst_day_of_week": worst_day,
+            "avg_completion_rate": completion_rate_percent(status_counts, sum(status_counts)),
+            "most_common_cancellation_reason": most_common_reason(status_counts[CANCELLED], state.reason_counts(30)),
+            "optimal_reminder_time": optimal_time.isoformat(),
+            "productivity_score": score
+        }
+    
+    def fold_task_chunks(self, user_id: int, days_back: int = 30, chunk_size: int = 1000) -> UserAnalyticsState:
+        """Agrega a janela sem manter as tarefas brutas em memória (lotes paginados ou GROUP BY, conforme o backend)"""
+        return self.db.build_analytics_state(user_id, days_back, chunk_size)
+    
+    def load_analytics_state(self, user_id: int) -> UserAnalyticsState:
+        """Lê os agregados do usuário, montando-os a partir das tarefas na primeira vez"""
+        state = self.db.get_analytics_state(user_id)
+        if state is None:
+            # Montado e gravado no banco numa única transação: escritas concorrentes entram na linha criada
+            state = self.db.init_analytics_state(user_id)
+        return state
+    
+    def run_full_analysis(self, user_id: int) -> Dict:
+        """Executa análise completa e salva no banco"""
+        # Os agregados incrementais substituem a releitura das tarefas brutas
+        state = self.load_analytics_state(user_id)
+        analytics = self.analyze_from_state(user_id, state)
         
         self.db.save_behavior_analytics(user_id, analytics)
         
         morning_time = time(hour=8, minute=0)
+        optimal_time = time.fromisoformat(analytics['optimal_reminder_time'])
         self.db.update_notification_settings(user_id, morning_time, optimal_time)
         
         return analytics
+    
+    async def run_full_analysis_async(self, user_id: int, async_db) -> Dict:
+        """Versão assíncrona de run_full_analysis: as duas gravações independentes seguem em paralelo"""
+        state = await async_db.get_analytics_state(user_id)
+        if state is None:
+            state = await async_db.init_analytics_state(user_id)
+        
+        analytics = self.analyze_from_state(user_id, state)
+        morning_time = time(hour=8, minute=0)
+        optimal_time = time.fromisoformat(analytics['optimal_reminder_time'])
+        await asyncio.gather(
+            async_db.save_behavior_analytics(user_id, analytics),
+            async_db.update_notification_settings(user_id, morning_time, optimal_time)
+        )
+        return analytics
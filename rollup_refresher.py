@@ -0,0 +1,81 @@
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from database import TaskDatabase
+from storage import create_database
+from metrics import instrumented, record_error, start_metrics_server
+
+class RollupRefresher:
+    """Mantém daily_task_rollups atualizada a partir das tarefas alteradas desde a última passada.
+    
+    Cada passada recalcula os dias com task_date recente (tarefas novas e canceladas) e os dias das tarefas
+    concluídas depois do maior completed_at já visto. Alterações fora disso (ex.: cancelar uma tarefa antiga)
+    entram na reconstrução completa, feita ao iniciar e a cada full_rebuild_interval.
+    """
+    
+    def __init__(self, db: TaskDatabase, interval: float = 60, full_rebuild_interval: float = 86400,
+                 recent_days: int = 1, overlap: float = 300, clock: Callable[[], datetime] = datetime.now):
+        self.db = db
+        self.interval = interval
+        self.full_rebuild_interval = full_rebuild_interval
+        # Dias para trás recalculados em toda passada (0 = só hoje em diante)
+        self.recent_days = recent_days
+        # Margem (segundos) antes do watermark: conclusões gravadas por transações ainda abertas na última passada
+        self.overlap = overlap
+        self.clock = clock
+        self.watermark: Optional[str] = None
+        self.last_full_rebuild: Optional[datetime] = None
+    
+    def date_since(self, today: date) -> date:
+        return today - timedelta(days=self.recent_days)
+    
+    def completed_since(self) -> str:
+        return (datetime.fromisoformat(self.watermark) - timedelta(seconds=self.overlap)).isoformat()
+    
+    @instrumented("rollups")
+    def refresh(self, full: bool = False) -> Dict:
+        """Uma passada incremental (ou a reconstrução completa); devolve o resultado da RPC"""
+        now = self.clock()
+        if full or self.watermark is None:
+            result = self.db.refresh_daily_rollups()
+            self.last_full_rebuild = now
+        else:
+            result = self.db.refresh_daily_rollups(completed_since=self.completed_since(), date_since=self.date_since(now.date()))
+        self.watermark = result.get("completed_watermark") or self.watermark
+        return result
+    
+    def due_for_full_rebuild(self, now: datetime) -> bool:
+        return self.last_full_rebuild is None or (now - self.last_full_rebuild).total_seconds() >= self.full_rebuild_interval
+    
+    def run(self, once: bool = False):
+        """Laço do serviço: uma passada a cada interval segundos"""
+        while True:
+            started = time.monotonic()
+            try:
+                result = self.refresh(full=self.due_for_full_rebuild(self.clock()))
+                print(f"{result.get('rows', 0)} dias recalculados (até {self.watermark})")
+            except Exception as e:
+                record_error("rollups", "refresh", e)
+                print(f"Erro ao atualizar daily_task_rollups: {e}")
+            if once:
+                return
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantém a tabela daily_task_rollups usada pelo dashboard em períodos longos")
+    parser.add_argument("--interval", type=float, default=60, help="Segundos entre passadas incrementais")
+    parser.add_argument("--full-rebuild-interval", type=float, default=86400, help="Segundos entre reconstruções completas")
+    parser.add_argument("--recent-days", type=int, default=1, help="Dias para trás recalculados em toda passada")
+    parser.add_argument("--once", action="store_true", help="Faz uma reconstrução completa e sai")
+    parser.add_argument("--metrics-port", type=int, help="Expõe as métricas no formato do Prometheus nesta porta")
+    args = parser.parse_args()
+    
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    refresher = RollupRefresher(create_database(), args.interval, args.full_rebuild_interval, args.recent_days)
+    refresher.run(once=args.once)
+
+if __name__ == "__main__":
+    main()
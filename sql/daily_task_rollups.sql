@@ -0,0 +1,97 @@
+-- Contagens diárias pré-agregadas por usuário, mantidas pelo rollup_refresher.py
+-- Lidas por TaskDatabase.get_daily_rollups: um ano de dashboard são no máximo 366 linhas por usuário
+create table if not exists daily_task_rollups (
+    user_id bigint not null,
+    task_date date not null,
+    pending integer not null default 0,
+    completed integer not null default 0,
+    cancelled integer not null default 0,
+    -- Conclusões por hora do dia (24 posições)
+    completion_hours integer[] not null default array_fill(0, array[24]),
+    -- {"motivo": n} das tarefas canceladas do dia
+    reasons jsonb not null default '{}'::jsonb,
+    refreshed_at timestamptz not null default now(),
+    primary key (user_id, task_date)
+);
+
+-- Busca das tarefas alteradas desde a última atualização
+create index if not exists tasks_completed_at_idx on tasks (completed_at);
+create index if not exists tasks_task_date_idx on tasks (task_date);
+
+-- Recalcula os dias (usuário, data) com tarefas em task_date >= p_date_since ou concluídas em completed_at >= p_completed_since;
+-- sem nenhum dos dois, reconstrói a tabela inteira. Chamada via PostgREST: POST /rest/v1/rpc/refresh_daily_task_rollups
+create or replace function refresh_daily_task_rollups(p_completed_since timestamptz default null, p_date_since date default null)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_full boolean := p_completed_since is null and p_date_since is null;
+    v_rows integer;
+    v_watermark timestamptz;
+begin
+    select max(completed_at) into v_watermark
+    from tasks
+    where completed_at >= coalesce(p_completed_since, '-infinity'::timestamptz);
+
+    if v_full then
+        delete from daily_task_rollups where true;
+    end if;
+
+    with touched as (
+        select distinct user_id, task_date
+        from tasks
+        where v_full
+           or task_date >= p_date_since
+           or completed_at >= p_completed_since
+    )
+    insert into daily_task_rollups (user_id, task_date, pending, completed, cancelled, completion_hours, reasons, refreshed_at)
+    select
+        d.user_id, d.task_date, d.pending, d.completed, d.cancelled,
+        coalesce(h.completion_hours, array_fill(0, array[24])),
+        coalesce(r.reasons, '{}'::jsonb),
+        now()
+    from (
+        select t.user_id, t.task_date,
+               count(*) filter (where t.status = 'pending') as pending,
+               count(*) filter (where t.status = 'completed') as completed,
+               count(*) filter (where t.status = 'cancelled') as cancelled
+        from tasks t
+        join touched using (user_id, task_date)
+        group by t.user_id, t.task_date
+    ) d
+    left join (
+        select user_id, task_date, array_agg(coalesce(n, 0) order by hour) as completion_hours
+        from touched
+        cross join generate_series(0, 23) as hour
+        left join (
+            select t.user_id, t.task_date, extract(hour from t.completed_at)::int as hour, count(*) as n
+            from tasks t
+            join touched using (user_id, task_date)
+            where t.status = 'completed' and t.completed_at is not null
+            group by 1, 2, 3
+        ) c using (user_id, task_date, hour)
+        group by user_id, task_date
+    ) h using (user_id, task_date)
+    left join (
+        select user_id, task_date, jsonb_object_agg(cancellation_reason, n) as reasons
+        from (
+            select t.user_id, t.task_date, t.cancellation_reason, count(*) as n
+            from tasks t
+            join touched using (user_id, task_date)
+            where t.status = 'cancelled' and t.cancellation_reason is not null
+            group by 1, 2, 3
+        ) x
+        group by user_id, task_date
+    ) r using (user_id, task_date)
+    on conflict (user_id, task_date) do update set
+        pending = excluded.pending,
+        completed = excluded.completed,
+        cancelled = excluded.cancelled,
+        completion_hours = excluded.completion_hours,
+        reasons = excluded.reasons,
+        refreshed_at = excluded.refreshed_at;
+
+    get diagnostics v_rows = row_count;
+    return jsonb_build_object('rows', v_rows, 'completed_watermark', coalesce(v_watermark, p_completed_since));
+end;
+$$;
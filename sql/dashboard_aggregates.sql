@@ -0,0 +1,43 @@
+-- Contagens pré-agregadas para os gráficos do dashboard (TaskDatabase.get_dashboard_aggregates)
+-- Chamada via PostgREST: POST /rest/v1/rpc/dashboard_task_aggregates
+create index if not exists tasks_user_date_status_idx on tasks (user_id, task_date, status);
+
+create or replace function dashboard_task_aggregates(p_user_id bigint, p_start date default null, p_end date default null)
+returns jsonb
+language sql
+stable
+as $$
+    with t as (
+        select task_date, status, completed_at, cancellation_reason
+        from tasks
+        where user_id = p_user_id
+          and (p_start is null or task_date >= p_start)
+          and (p_end is null or task_date <= p_end)
+    )
+    select jsonb_build_object(
+        'by_day', coalesce((
+            select jsonb_agg(jsonb_build_object('task_date', task_date, 'status', status, 'count', n) order by task_date, status)
+            from (select task_date, status, count(*) as n from t group by task_date, status) d
+        ), '[]'::jsonb),
+        'by_hour', coalesce((
+            select jsonb_agg(jsonb_build_object('hour', hour, 'count', n) order by hour)
+            from (
+                select extract(hour from completed_at)::int as hour, count(*) as n
+                from t
+                where status = 'completed' and completed_at is not null
+                group by 1
+            ) h
+        ), '[]'::jsonb),
+        'reasons', coalesce((
+            select jsonb_agg(jsonb_build_object('reason', cancellation_reason, 'count', n) order by n desc)
+            from (
+                select cancellation_reason, count(*) as n
+                from t
+                where status = 'cancelled' and cancellation_reason is not null
+                group by cancellation_reason
+                order by n desc
+                limit 5
+            ) r
+        ), '[]'::jsonb)
+    );
+$$;
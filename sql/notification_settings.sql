@@ -0,0 +1,23 @@
+-- Índices usados pelo notification_scheduler.py
+-- Leitura incremental das configurações alteradas desde a última atualização
+create index if not exists notification_settings_adjusted_idx on notification_settings (last_adjusted_at);
+
+-- last_adjusted_at vem do relógio do servidor, não do processo que grava (relógios atrasados
+-- fariam a linha cair antes do watermark do agendador e só aparecer na recarga completa)
+create or replace function notification_settings_touch()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.last_adjusted_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists notification_settings_touch on notification_settings;
+create trigger notification_settings_touch
+    before insert or update on notification_settings
+    for each row execute function notification_settings_touch();
+
+-- Tarefas pendentes do dia de vários usuários de uma vez (user_id in (...) and task_date = ? and status = 'pending')
+create index if not exists tasks_pending_user_date_idx on tasks (user_id, task_date, id) where status = 'pending';
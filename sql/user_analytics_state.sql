@@ -0,0 +1,179 @@
+-- Agregados incrementais por usuário usados pelo ProductivityAnalyzer
+-- days: {"AAAA-MM-DD": {"status": [pendentes, concluídas, canceladas], "hours": [24 bins], "reasons": {"motivo": n}}}
+create table if not exists user_analytics_state (
+    user_id bigint primary key,
+    days jsonb not null default '{}'::jsonb,
+    updated_at timestamptz not null default now()
+);
+
+-- Aplica a variação de uma escrita em tarefas aos agregados do dia, numa única instrução atômica.
+-- A linha do usuário fica travada até o fim da transação, então incrementos de processos diferentes
+-- não se sobrescrevem. Sem estado gravado não faz nada (retorna false): a próxima análise o monta.
+-- Chamada pelos gatilhos de tasks abaixo; os parâmetros são os de analytics_state.analytics_delta
+create or replace function apply_analytics_delta(
+    p_user_id bigint,
+    p_task_date date,
+    p_status text,
+    p_previous_status text default null,
+    p_hour integer default null,
+    p_reason text default null,
+    p_count integer default 1,
+    p_window_days integer default 30
+)
+returns boolean
+language plpgsql
+as $$
+declare
+    v_key text := p_task_date::text;
+    v_cutoff text := (current_date - p_window_days)::text;
+    v_statuses text[] := array['pending', 'completed', 'cancelled'];
+    v_to text := (array_position(v_statuses, p_status) - 1)::text;
+    v_from text := (array_position(v_statuses, p_previous_status) - 1)::text;
+    v_days jsonb;
+    v_day jsonb;
+begin
+    select days into v_days from user_analytics_state where user_id = p_user_id for update;
+    if not found then
+        -- Espera uma init_analytics_state em andamento: se ela gravou a linha, a variação entra nela;
+        -- senão a trava fica com esta transação e a varredura da init verá esta escrita
+        perform pg_advisory_xact_lock(p_user_id);
+        select days into v_days from user_analytics_state where user_id = p_user_id for update;
+        if not found then
+            return false;
+        end if;
+    end if;
+
+    if v_key >= v_cutoff then
+        v_day := coalesce(
+            v_days -> v_key,
+            jsonb_build_object('status', jsonb_build_array(0, 0, 0), 'hours', to_jsonb(array_fill(0, array[24])), 'reasons', '{}'::jsonb)
+        );
+        if v_from is not null then
+            v_day := jsonb_set(v_day, array['status', v_from], to_jsonb(greatest((v_day #>> array['status', v_from])::int - p_count, 0)));
+        end if;
+        v_day := jsonb_set(v_day, array['status', v_to], to_jsonb((v_day #>> array['status', v_to])::int + p_count));
+        if p_hour is not null then
+            v_day := jsonb_set(v_day, array['hours', p_hour::text], to_jsonb((v_day #>> array['hours', p_hour::text])::int + p_count));
+        end if;
+        if p_reason is not null and p_reason <> '' then
+            v_day := jsonb_set(v_day, array['reasons', p_reason], to_jsonb(coalesce((v_day #>> array['reasons', p_reason])::int, 0) + p_count));
+        end if;
+        v_days := jsonb_set(v_days, array[v_key], v_day);
+    end if;
+
+    -- Descarta os dias que saíram da janela, como UserAnalyticsState.expire
+    v_days := v_days - coalesce((select array_agg(k) from jsonb_object_keys(v_days) as k where k < v_cutoff), '{}'::text[]);
+    update user_analytics_state set days = v_days, updated_at = now() where user_id = p_user_id;
+    return true;
+end;
+$$;
+
+-- Monta o estado inicial do usuário a partir das tarefas da janela, se ainda não existir, e devolve os days gravados.
+-- A trava consultiva por usuário ordena a varredura com as escritas que chegam enquanto não há linha
+-- (ver apply_analytics_delta): nenhuma se perde nem é contada duas vezes, e inits concorrentes não se sobrescrevem
+create or replace function init_analytics_state(p_user_id bigint, p_window_days integer default 30)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_days jsonb;
+begin
+    perform pg_advisory_xact_lock(p_user_id);
+    select days into v_days from user_analytics_state where user_id = p_user_id;
+    if found then
+        return v_days;
+    end if;
+
+    with window_tasks as (
+        select task_date::text as day, status,
+               case when status = 'completed' then extract(hour from completed_at)::int end as hour,
+               case when status = 'cancelled' then nullif(cancellation_reason, '') end as reason
+        from tasks
+        where user_id = p_user_id
+          and task_date >= current_date - p_window_days
+          and status in ('pending', 'completed', 'cancelled')
+    ),
+    statuses as (
+        select day, jsonb_build_array(
+                   count(*) filter (where status = 'pending'),
+                   count(*) filter (where status = 'completed'),
+                   count(*) filter (where status = 'cancelled')
+               ) as status
+        from window_tasks
+        group by day
+    ),
+    hours as (
+        select s.day, jsonb_agg(coalesce(c.n, 0) order by h) as hours
+        from statuses as s
+        cross join generate_series(0, 23) as h
+        left join (
+            select day, hour, count(*)::int as n from window_tasks where hour is not null group by 1, 2
+        ) as c on c.day = s.day and c.hour = h
+        group by s.day
+    ),
+    reasons as (
+        select day, jsonb_object_agg(reason, n) as reasons
+        from (select day, reason, count(*)::int as n from window_tasks where reason is not null group by 1, 2) as r
+        group by day
+    )
+    select coalesce(
+               jsonb_object_agg(s.day, jsonb_build_object('status', s.status, 'hours', h.hours, 'reasons', coalesce(r.reasons, '{}'::jsonb))),
+               '{}'::jsonb
+           )
+    into v_days
+    from statuses as s
+    join hours as h using (day)
+    left join reasons as r using (day);
+
+    insert into user_analytics_state (user_id, days) values (p_user_id, v_days)
+    on conflict (user_id) do nothing;
+    return v_days;
+end;
+$$;
+
+-- Mantém os agregados na mesma transação das escritas em tasks: o bot grava a tarefa numa única
+-- requisição e, se a variação falhar, a escrita inteira é desfeita (os agregados nunca ficam defasados)
+create or replace function analytics_state_on_task_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+    -- Um incremento por (usuário, dia, status) do lote inserido
+    perform apply_analytics_delta(user_id, task_date, status, null, hour, reason, n)
+    from (
+        select user_id, task_date, status,
+               case when status = 'completed' then extract(hour from completed_at)::int end as hour,
+               case when status = 'cancelled' then cancellation_reason end as reason,
+               count(*)::int as n
+        from inserted
+        group by 1, 2, 3, 4, 5
+    ) as batch;
+    return null;
+end;
+$$;
+
+create or replace function analytics_state_on_task_update()
+returns trigger
+language plpgsql
+as $$
+begin
+    perform apply_analytics_delta(
+        new.user_id, new.task_date, new.status, old.status,
+        case when new.status = 'completed' then extract(hour from new.completed_at)::int end,
+        case when new.status = 'cancelled' then new.cancellation_reason end
+    );
+    return null;
+end;
+$$;
+
+drop trigger if exists tasks_analytics_state_insert on tasks;
+create trigger tasks_analytics_state_insert
+    after insert on tasks
+    referencing new table as inserted
+    for each statement execute function analytics_state_on_task_insert();
+
+drop trigger if exists tasks_analytics_state_update on tasks;
+create trigger tasks_analytics_state_update
+    after update of status on tasks
+    for each row when (old.status is distinct from new.status)
+    execute function analytics_state_on_task_update();
@@ -0,0 +1,30 @@
+from functools import lru_cache
+from typing import Optional
+
+from config import SQLITE_PATH, STORAGE_BACKEND
+from database import TaskDatabase
+from local_database import LocalTaskDatabase
+
+STORAGE_BACKENDS = {
+    "supabase": TaskDatabase,
+    "sqlite": LocalTaskDatabase,
+}
+
+def create_database(backend: Optional[str] = None, path: Optional[str] = None, cache_size: int = 512) -> TaskDatabase:
+    """Monta o TaskDatabase do backend configurado ("supabase" ou "sqlite")"""
+    backend = backend or STORAGE_BACKEND
+    if backend == "sqlite":
+        return LocalTaskDatabase(path or SQLITE_PATH, cache_size=cache_size)
+    return STORAGE_BACKENDS[backend](cache_size=cache_size)
+
+@lru_cache(maxsize=None)
+def get_database() -> TaskDatabase:
+    """TaskDatabase do backend configurado, único no processo (mesmo cliente e mesmo cache de leituras)"""
+    return create_database()
+
+def create_async_database(db: TaskDatabase):
+    """Interface assíncrona do mesmo banco: cliente HTTP próprio no Supabase, threads no backend local"""
+    from async_database import AsyncTaskDatabase, ThreadedAsyncDatabase
+    if isinstance(db, LocalTaskDatabase):
+        return ThreadedAsyncDatabase(db)
+    return AsyncTaskDatabase(cache=db.cache)
@@ -0,0 +1,165 @@
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, Union
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from task_table import TaskTable
+
+TASK_STATUSES = ["pending", "completed", "cancelled"]
+PENDING, COMPLETED, CANCELLED = range(3)
+STATUS_CODES = {status: code for code, status in enumerate(TASK_STATUSES)}
+
+def status_codes(df: Union["pd.DataFrame", TaskTable]) -> np.ndarray:
+    """Códigos categóricos de status (0=pending, 1=completed, 2=cancelled, -1=desconhecido)"""
+    if isinstance(df, TaskTable):
+        # O enum uint8 usa 255 para desconhecido, que é -1 visto como int8
+        return df.status.view(np.int8)
+    # Importado aqui: com TaskTable as métricas não dependem do pandas
+    import pandas as pd
+    status = df['status']
+    if not isinstance(status.dtype, pd.CategoricalDtype) or list(status.cat.categories) != TASK_STATUSES:
+        status = pd.Categorical(status, categories=TASK_STATUSES)
+    else:
+        status = status.array
+    return np.asarray(status.codes)
+
+def hourly_completion_counts(df: Union["pd.DataFrame", TaskTable], codes: Optional[np.ndarray] = None) -> np.ndarray:
+    """Histograma de 24 posições com as conclusões por hora"""
+    if codes is None:
+        codes = status_codes(df)
+    if isinstance(df, TaskTable):
+        hours = df.completion_hour[(codes == COMPLETED) & (df.completion_hour >= 0)]
+        return np.bincount(hours, minlength=24)
+    completed_at = df['completed_at'][codes == COMPLETED]
+    hours = completed_at.dt.hour.dropna().to_numpy(dtype=np.int64)
+    return np.bincount(hours, minlength=24)
+
+def weekday_status_counts(df: Union["pd.DataFrame", TaskTable], codes: Optional[np.ndarray] = None) -> np.ndarray:
+    """Matriz 7×3 de dia da semana por status"""
+    if codes is None:
+        codes = status_codes(df)
+    if isinstance(df, TaskTable):
+        # 1970-01-01 foi uma quinta-feira (dayofweek 3)
+        weekday = (df.day.astype(np.int64) + 3) % 7
+    else:
+        weekday = df['task_date'].dt.dayofweek.to_numpy(dtype=np.float64, na_value=-1).astype(np.int64)
+    valid = (codes >= 0) & (weekday >= 0)
+    flat = np.bincount(weekday[valid] * 3 + codes[valid], minlength=21)
+    return flat.reshape(7, 3)
+
+def daily_status_counts(df: Union["pd.DataFrame", TaskTable], codes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Contagens por data e status: (datas em datetime64[D], matriz N×3)"""
+    if codes is None:
+        codes = status_codes(df)
+    days = df.dates if isinstance(df, TaskTable) else df['task_date'].to_numpy(dtype='datetime64[D]')
+    valid = (codes >= 0) & ~np.isnat(days)
+    if not valid.any():
+        return np.array([], dtype='datetime64[D]'), np.zeros((0, 3), dtype=np.int64)
+    
+    day_numbers = days[valid].astype(np.int64)
+    first_day = day_numbers.min()
+    offsets = day_numbers - first_day
+    n_days = int(offsets.max()) + 1
+    counts = np.bincount(offsets * 3 + codes[valid], minlength=n_days * 3).reshape(n_days, 3)
+    dates = (first_day + np.arange(n_days)).astype('datetime64[D]')
+    return dates, counts
+
+class TaskTables:
+    """Tabelas de hora, dia da semana, data e status usadas pelos gráficos"""
+    
+    def __init__(self, status_counts: np.ndarray, hourly_completed: np.ndarray, weekday_status: np.ndarray, dates: np.ndarray, daily_status: np.ndarray, total: Optional[int] = None):
+        self.status_counts = status_counts
+        self.hourly_completed = hourly_completed
+        self.weekday_status = weekday_status
+        self.dates = dates
+        self.daily_status = daily_status
+        self.total = int(status_counts.sum()) if total is None else total
+    
+    @classmethod
+    def from_frame(cls, df: Union["pd.DataFrame", TaskTable]) -> "TaskTables":
+        """Monta todas as tabelas numa única passada vetorizada sobre as linhas (DataFrame ou TaskTable)"""
+        codes = status_codes(df)
+        dates, daily_status = daily_status_counts(df, codes)
+        return cls(
+            status_counts=np.bincount(codes[codes >= 0], minlength=3),
+            hourly_completed=hourly_completion_counts(df, codes),
+            weekday_status=weekday_status_counts(df, codes),
+            dates=dates,
+            daily_status=daily_status,
+            total=len(df)
+        )
+    
+    @classmethod
+    def from_aggregates(cls, aggregates: Dict) -> "TaskTables":
+        """Monta as tabelas a partir das contagens agregadas no servidor"""
+        by_day = aggregates.get("by_day") or []
+        hourly = np.zeros(24, dtype=np.int64)
+        for row in aggregates.get("by_hour") or []:
+            hourly[int(row["hour"])] = row["count"]
+        
+        days = np.array([str(row["task_date"])[:10] for row in by_day], dtype='datetime64[D]')
+        codes = np.array([STATUS_CODES.get(row["status"], -1) for row in by_day], dtype=np.int64)
+        counts = np.array([row["count"] for row in by_day], dtype=np.int64)
+        valid = codes >= 0
+        # Sem dias ou só com status desconhecidos: tabelas vazias
+        if not valid.any():
+            empty = np.zeros(3, dtype=np.int64)
+            return cls(empty, hourly, np.zeros((7, 3), dtype=np.int64), np.array([], dtype='datetime64[D]'), np.zeros((0, 3), dtype=np.int64))
+        days, codes, counts = days[valid], codes[valid], counts[valid]
+        
+        day_numbers = days.astype(np.int64)
+        first_day = day_numbers.min()
+        offsets = day_numbers - first_day
+        n_days = int(offsets.max()) + 1
+        daily_status = np.bincount(offsets * 3 + codes, weights=counts, minlength=n_days * 3).astype(np.int64).reshape(n_days, 3)
+        dates = (first_day + np.arange(n_days)).astype('datetime64[D]')
+        # 1970-01-01 foi uma quinta-feira (dayofweek 3)
+        weekday = (day_numbers + 3) % 7
+        weekday_status = np.bincount(weekday * 3 + codes, weights=counts, minlength=21).astype(np.int64).reshape(7, 3)
+        return cls(daily_status.sum(axis=0), hourly, weekday_status, dates, daily_status)
+
+def best_and_worst_hour(hourly: np.ndarray) -> Optional[Tuple[int, int]]:
+    """Hora com mais e com menos conclusões, considerando só as horas com alguma"""
+    hourly = np.asarray(hourly)
+    active = np.flatnonzero(hourly)
+    if len(active) == 0:
+        return None
+    values = hourly[active]
+    return int(active[values.argmax()]), int(active[values.argmin()])
+
+def weekday_completion_rates(weekday_status: np.ndarray) -> Dict[int, float]:
+    """Taxa de conclusão por dia da semana, só para dias com tarefas"""
+    weekday_status = np.asarray(weekday_status)
+    totals = weekday_status.sum(axis=1)
+    active = np.flatnonzero(totals)
+    rates = weekday_status[active, COMPLETED] / totals[active]
+    return {int(day): float(rate) for day, rate in zip(active, rates)}
+
+def best_and_worst_day(rates: Dict[int, float]) -> Optional[Tuple[int, int]]:
+    """Dia da semana com a maior e com a menor taxa de conclusão"""
+    if not rates:
+        return None
+    return max(rates, key=rates.get), min(rates, key=rates.get)
+
+def productivity_score(status_counts, total: int, active_days: int, days_back: int) -> float:
+    """Score de produtividade (0-100) a partir das contagens por status e dos dias com tarefas da janela"""
+    if not total:
+        return 50.0
+    completion_rate = status_counts[COMPLETED] / total
+    cancellation_rate = status_counts[CANCELLED] / total
+    consistency_bonus = min(active_days / days_back, 1.0) * 20
+    
+    base_score = completion_rate * 60
+    penalty = cancellation_rate * 20
+    return round(min(base_score - penalty + consistency_bonus, 100), 2)
+
+def completion_rate_percent(status_counts, total: int) -> float:
+    """Percentual de tarefas concluídas"""
+    return round(status_counts[COMPLETED] / total * 100, 2) if total else 0.0
+
+def most_common_reason(cancelled: int, reason_counts: Dict[str, int]) -> str:
+    """Motivo de cancelamento mais frequente, ou o texto exibido quando não há cancelamentos"""
+    if not cancelled:
+        return "Nenhum cancelamento"
+    return max(reason_counts, key=reason_counts.get) if reason_counts else "N/A"
@@ -0,0 +1,176 @@
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+from analytics_state import STATUS_INDEX
+
+TASK_STATUSES = list(STATUS_INDEX)
+# Marcadores de ausência nas colunas inteiras
+UNKNOWN_STATUS = 255
+NO_HOUR = -1
+NO_CODE = -1
+
+def parse_days(values: Iterable) -> np.ndarray:
+    """Datas ISO ("2024-05-01" ou com hora) em número de dias desde 1970-01-01"""
+    days = np.array([str(value)[:10] for value in values], dtype="datetime64[D]")
+    return days.astype(np.int64).astype(np.int32)
+
+def parse_hours(values: Iterable) -> np.ndarray:
+    """Hora de timestamps ISO lida direto do texto, no fuso gravado (como em UserAnalyticsState)"""
+    return np.array([int(str(value)[11:13]) if value else NO_HOUR for value in values], dtype=np.int8)
+
+def intern_values(values: Iterable, vocabulary: Dict[str, int]) -> np.ndarray:
+    """Códigos int32 de cada valor no vocabulário (acrescentando os novos); None vira NO_CODE"""
+    return np.array(
+        [vocabulary.setdefault(value, len(vocabulary)) if value else NO_CODE for value in values],
+        dtype=np.int32
+    )
+
+def code_dtype(size: int) -> type:
+    """Menor inteiro com sinal para os códigos de um vocabulário, o mesmo que o Categorical do pandas usa"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+class TaskTable:
+    """Tarefas de um usuário em colunas NumPy compactas, compartilhadas pelo analisador e pelo dashboard.
+    
+    status é um enum uint8 (UNKNOWN_STATUS se desconhecido), day o número de dias desde 1970-01-01 (int32)
+    e completion_hour a hora de conclusão (int8, NO_HOUR se não concluída). Motivos e descrições ficam
+    internados: cada texto distinto aparece uma vez no vocabulário e as linhas guardam só o código
+    (NO_CODE se vazio), no menor inteiro que comporta o vocabulário.
+    As descrições só são lidas do banco quando pedidas, por description_loader.
+    """
+    
+    def __init__(self, status: np.ndarray, day: np.ndarray, completion_hour: np.ndarray, reason: np.ndarray,
+                 reasons: List[str], ids: Optional[np.ndarray] = None,
+                 description_loader: Optional[Callable[[List[str]], Dict[str, str]]] = None,
+                 description: Optional[np.ndarray] = None, descriptions: Optional[List[str]] = None):
+        self.status = status
+        self.day = day
+        self.completion_hour = completion_hour
+        self.reason = reason
+        self.reasons = reasons
+        self.ids = ids
+        self.description_loader = description_loader
+        self._description = description
+        self._descriptions = descriptions
+    
+    @classmethod
+    def from_rows(cls, rows: List[Dict], description_loader: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> "TaskTable":
+        """Monta a tabela das linhas do banco (lista de dicts)"""
+        names = ("id", "task_date", "status", "completed_at", "cancellation_reason", "task_description")
+        columns = {name: [row.get(name) for row in rows] for name in names if rows and name in rows[0]}
+        return cls.from_chunks([columns], description_loader)
+    
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict[str, list]], description_loader: Optional[Callable[[List[str]], Dict[str, str]]] = None) -> "TaskTable":
+        """Monta a tabela lote a lote (formato de iter_task_chunks), sem manter as linhas brutas de todos os lotes"""
+        reasons: Dict[str, int] = {}
+        descriptions: Dict[str, int] = {}
+        parts = {"status": [], "day": [], "completion_hour": [], "reason": [], "ids": [], "description": []}
+        for chunk in chunks:
+            n = len(chunk.get("task_date") or [])
+            if not n:
+                continue
+            parts["status"].append(np.array([STATUS_INDEX.get(status, UNKNOWN_STATUS) for status in chunk["status"]], dtype=np.uint8))
+            parts["day"].append(parse_days(chunk["task_date"]))
+            parts["completion_hour"].append(parse_hours(chunk.get("completed_at") or [None] * n))
+            parts["reason"].append(intern_values(chunk.get("cancellation_reason") or [None] * n, reasons))
+            # Os ids só servem para buscar as descrições depois; sem quem as busque, não ficam na memória
+            if description_loader is not None and "id" in chunk:
+                parts["ids"].append(np.array(chunk["id"], dtype=object))
+            if "task_description" in chunk:
+                parts["description"].append(intern_values(chunk["task_description"], descriptions))
+        
+        def join(name: str, dtype) -> Optional[np.ndarray]:
+            # Colunas opcionais só valem se vieram em todos os lotes
+            if len(parts[name]) != len(parts["status"]):
+                return None
+            return np.concatenate(parts[name]).astype(dtype, copy=False) if parts[name] else np.array([], dtype=dtype)
+        
+        description = join("description", code_dtype(len(descriptions)))
+        return cls(
+            status=join("status", np.uint8),
+            day=join("day", np.int32),
+            completion_hour=join("completion_hour", np.int8),
+            reason=join("reason", code_dtype(len(reasons))),
+            reasons=list(reasons),
+            ids=join("ids", object) if description_loader is not None else None,
+            description_loader=description_loader,
+            description=description,
+            descriptions=list(descriptions) if description is not None else None
+        )
+    
+    def __len__(self) -> int:
+        return len(self.status)
+    
+    @property
+    def nbytes(self) -> int:
+        """Memória das colunas numéricas (os vocabulários internados não entram)"""
+        columns = (self.status, self.day, self.completion_hour, self.reason, self._description)
+        return sum(column.nbytes for column in columns if column is not None)
+    
+    @property
+    def dates(self) -> np.ndarray:
+        return self.day.astype("datetime64[D]")
+    
+    def take(self, mask: np.ndarray) -> "TaskTable":
+        """Linhas selecionadas por máscara ou índices, com os mesmos vocabulários"""
+        return TaskTable(
+            self.status[mask], self.day[mask], self.completion_hour[mask], self.reason[mask], self.reasons,
+            ids=self.ids[mask] if self.ids is not None else None,
+            description_loader=self.description_loader,
+            description=self._description[mask] if self._description is not None else None,
+            descriptions=self._descriptions
+        )
+    
+    def since(self, start_day: np.datetime64) -> "TaskTable":
+        """Tarefas com task_date a partir do dia dado"""
+        return self.take(self.day >= np.datetime64(start_day, "D").astype(np.int64))
+    
+    def status_counts(self) -> np.ndarray:
+        """Quantidade de tarefas em cada status (pendente, concluída, cancelada)"""
+        return np.bincount(self.status[self.status != UNKNOWN_STATUS], minlength=3)[:3]
+    
+    def reason_counts(self) -> Dict[str, int]:
+        """Motivos das tarefas canceladas, do mais frequente para o menos"""
+        codes = self.reason[(self.status == STATUS_INDEX["cancelled"]) & (self.reason != NO_CODE)]
+        counts = np.bincount(codes, minlength=len(self.reasons))
+        order = np.argsort(-counts, kind="stable")
+        return {self.reasons[code]: int(counts[code]) for code in order if counts[code]}
+    
+    @property
+    def cancellation_reasons(self) -> List[Optional[str]]:
+        return [self.reasons[code] if code != NO_CODE else None for code in self.reason]
+    
+    @property
+    def descriptions(self) -> List[Optional[str]]:
+        """Descrição de cada tarefa, buscada no banco no primeiro acesso quando não veio na leitura"""
+        if self._description is None:
+            if self.description_loader is None or self.ids is None:
+                raise ValueError("Tabela sem descrições nem description_loader para buscá-las")
+            by_id = self.description_loader(list(self.ids))
+            vocabulary: Dict[str, int] = {}
+            codes = intern_values([by_id.get(task_id) for task_id in self.ids], vocabulary)
+            self._description = codes.astype(code_dtype(len(vocabulary)), copy=False)
+            self._descriptions = list(vocabulary)
+        return [self._descriptions[code] if code != NO_CODE else None for code in self._description]
+    
+    def to_pandas(self, dates: bool = False):
+        """DataFrame que compartilha a memória das colunas (status e motivo viram Categorical sobre os mesmos códigos).
+        
+        Com dates=True acrescenta task_date em datetime64, a única coluna copiada.
+        """
+        # Importado aqui: o analisador trabalha direto nas colunas e não precisa do pandas
+        import pandas as pd
+        frame = {
+            # uint8 255 é -1 em int8: o código de "desconhecido" do Categorical
+            "status": pd.Categorical.from_codes(self.status.view(np.int8), categories=TASK_STATUSES, validate=False),
+            "day": self.day,
+            "completion_hour": self.completion_hour,
+            "cancellation_reason": pd.Categorical.from_codes(self.reason, categories=self.reasons, validate=False),
+        }
+        if dates:
+            frame["task_date"] = self.dates.astype("datetime64[s]")
+        return pd.DataFrame(frame, copy=False)
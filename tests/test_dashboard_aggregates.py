@@ -0,0 +1,89 @@
+"""Agregados do dashboard (SQL e daily_task_rollups) contra a contagem linha a linha, no backend SQLite local"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from bench_storage import populate
+from local_database import LocalTaskDatabase
+from task_metrics import TaskTables
+from task_table import TaskTable
+
+USERS = 3
+DAYS = 45
+
+@pytest.fixture
+def db():
+    db = LocalTaskDatabase()
+    populate(db, users=USERS, days=DAYS, tasks_per_day=4, seed=7)
+    return db
+
+def raw_tasks(db: LocalTaskDatabase, user_id: int, start_date=None, end_date=None):
+    where, params = db._date_filters(user_id, start_date, end_date)
+    return db._query(f"select * from tasks where {where}", params)
+
+def recompute(tasks):
+    """Contagens por (dia, status), hora de conclusão e motivo, linha a linha"""
+    by_day = Counter((task["task_date"], task["status"]) for task in tasks)
+    by_hour = Counter(int(task["completed_at"][11:13]) for task in tasks if task["status"] == "completed" and task["completed_at"])
+    reasons = Counter(task["cancellation_reason"] for task in tasks if task["status"] == "cancelled" and task["cancellation_reason"])
+    return by_day, by_hour, reasons
+
+def normalize(aggregates):
+    return (
+        Counter({(str(row["task_date"])[:10], row["status"]): row["count"] for row in aggregates["by_day"]}),
+        Counter({row["hour"]: row["count"] for row in aggregates["by_hour"]}),
+        Counter({row["reason"]: row["count"] for row in aggregates["reasons"]}),
+    )
+
+def assert_same_tables(aggregates, tasks):
+    expected = TaskTables.from_frame(TaskTable.from_rows(tasks))
+    actual = TaskTables.from_aggregates(aggregates)
+    np.testing.assert_array_equal(actual.status_counts, expected.status_counts)
+    np.testing.assert_array_equal(actual.hourly_completed, expected.hourly_completed)
+    np.testing.assert_array_equal(actual.weekday_status, expected.weekday_status)
+    np.testing.assert_array_equal(actual.dates, expected.dates)
+    np.testing.assert_array_equal(actual.daily_status, expected.daily_status)
+
+WINDOWS = [(None, None), (30, 0), (20, 10)]
+
+def window(days):
+    start, end = days
+    today = date.today()
+    return (today - timedelta(days=start) if start is not None else None, today - timedelta(days=end) if end is not None else None)
+
+@pytest.mark.parametrize("days", WINDOWS)
+def test_dashboard_aggregates_match_rows(db, days):
+    start_date, end_date = window(days)
+    for user_id in range(1, USERS + 1):
+        tasks = raw_tasks(db, user_id, start_date, end_date)
+        aggregates = db.get_dashboard_aggregates(user_id, start_date, end_date)
+        assert normalize(aggregates) == recompute(tasks)
+        assert_same_tables(aggregates, tasks)
+
+@pytest.mark.parametrize("days", WINDOWS)
+def test_rollup_aggregates_match_rows(db, days):
+    db.refresh_daily_rollups()
+    start_date, end_date = window(days)
+    for user_id in range(1, USERS + 1):
+        tasks = raw_tasks(db, user_id, start_date, end_date)
+        aggregates = db.get_rollup_aggregates(user_id, start_date, end_date)
+        assert normalize(aggregates) == recompute(tasks)
+        assert_same_tables(aggregates, tasks)
+
+def test_incremental_rollup_refresh_matches_rows(db):
+    watermark = db.refresh_daily_rollups()["completed_watermark"]
+    today = date.today()
+    for i in range(6):
+        task = db.add_task(1, f"nova {i}", today)
+        if i % 3 == 1:
+            db.complete_task(task["id"])
+        elif i % 3 == 2:
+            db.cancel_task(task["id"], "imprevisto")
+    
+    completed_since = (datetime.fromisoformat(watermark) - timedelta(seconds=300)).isoformat()
+    db.refresh_daily_rollups(completed_since=completed_since, date_since=today - timedelta(days=1))
+    tasks = raw_tasks(db, 1)
+    assert normalize(db.get_rollup_aggregates(1)) == recompute(tasks)
+    assert normalize(db.get_dashboard_aggregates(1)) == recompute(tasks)
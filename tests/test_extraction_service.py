@@ -0,0 +1,106 @@
+"""ExtractionService e TokenBucket com um modelo falso, sem rede nem cota do Gemini"""
+import asyncio
+import json
+import re
+import time
+
+from extraction_service import ExtractionService
+from llm_cache import LLMCache
+from llm_processor import TaskProcessor
+from rate_limit import TokenBucket
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeModel:
+    """Responde aos prompts de lote e individuais com uma tarefa por mensagem ("Fazer <mensagem>")"""
+    
+    def __init__(self, drop_ids=()):
+        self.prompts = []
+        self.drop_ids = set(drop_ids)
+    
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        batch = re.findall(r'^(\d+): "(.*)"$', prompt, re.MULTILINE)
+        if batch:
+            results = [{"id": int(i), "tasks": [f"Fazer {message}"]} for i, message in batch if int(i) not in self.drop_ids]
+            return FakeResponse(json.dumps({"results": results}))
+        message = re.search(r'Mensagem: "(.*)"', prompt).group(1)
+        return FakeResponse(json.dumps({"tasks": [f"Fazer {message}"]}))
+
+def make_service(model: FakeModel, **kwargs) -> ExtractionService:
+    # Atalho local desligado: todas as mensagens vão para o modelo
+    processor = TaskProcessor(model=model, cache=LLMCache(), local_threshold=float("inf"), structured=False)
+    return ExtractionService(processor, **{"workers": 1, "requests_per_minute": 6000, **kwargs})
+
+async def extract_all(service: ExtractionService, messages):
+    async with service:
+        return await asyncio.gather(*(service.extract_tasks(message) for message in messages))
+
+def test_short_messages_share_one_batch_call():
+    model = FakeModel()
+    messages = ["mensagem a", "mensagem b", "mensagem c", "mensagem d"]
+    results = asyncio.run(extract_all(make_service(model, batch_size=4, batch_window=0.2), messages))
+    
+    assert results == [[f"Fazer {message}"] for message in messages]
+    assert len(model.prompts) == 1
+
+def test_messages_missing_from_batch_are_retried_alone():
+    model = FakeModel(drop_ids={1})
+    messages = ["mensagem a", "mensagem b", "mensagem c"]
+    results = asyncio.run(extract_all(make_service(model, batch_size=3, batch_window=0.2), messages))
+    
+    assert results == [[f"Fazer {message}"] for message in messages]
+    # Um lote e uma chamada individual para a mensagem que faltou
+    assert len(model.prompts) == 2
+    assert 'Mensagem: "mensagem b"' in model.prompts[1]
+
+def test_long_messages_skip_the_batch():
+    model = FakeModel()
+    long_message = "mensagem longa " * 20
+    results = asyncio.run(extract_all(make_service(model, batch_size=4, batch_window=0.1, short_message_chars=50), ["curta", long_message]))
+    
+    assert results == [["Fazer curta"], [f"Fazer {long_message}"]]
+    assert not any(re.search(r"^\d+: ", prompt, re.MULTILINE) and long_message in prompt for prompt in model.prompts)
+
+def test_repeated_messages_are_served_from_cache():
+    model = FakeModel()
+    service = make_service(model)
+    
+    async def run():
+        async with service:
+            first = await service.extract_tasks("pagar a conta")
+            second = await service.extract_tasks("  Pagar a conta. ")
+            return first, second
+    
+    assert asyncio.run(run()) == (["Fazer pagar a conta"], ["Fazer pagar a conta"])
+    assert len(model.prompts) == 1
+
+def test_token_bucket_allows_burst_then_waits_for_rate():
+    # 20 fichas por segundo, rajada de 2: as duas primeiras saem na hora, as duas seguintes esperam ~0,1 s
+    bucket = TokenBucket(1200, capacity=2)
+    
+    async def acquire(n):
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+    
+    async def run():
+        return await acquire(2), await acquire(2)
+    
+    burst, limited = asyncio.run(run())
+    assert burst < 0.02
+    assert 0.08 <= limited < 0.5
+
+def test_service_calls_wait_for_the_quota():
+    model = FakeModel()
+    # 600 por minuto com rajada de 1: três mensagens individuais levam ao menos 0,2 s
+    service = make_service(model, requests_per_minute=600)
+    service.limiter = TokenBucket(600, capacity=1)
+    start = time.monotonic()
+    asyncio.run(extract_all(service, ["mensagem a", "mensagem b", "mensagem c"]))
+    
+    assert len(model.prompts) == 3
+    assert time.monotonic() - start >= 0.18
@@ -0,0 +1,57 @@
+"""Modo estruturado do TaskProcessor com um modelo falso: novas tentativas só enquanto nada chegou ao chamador"""
+import pytest
+
+import llm_processor
+from llm_cache import LLMCache
+from llm_processor import TaskProcessor
+
+class Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+class StreamingModel:
+    """Cada chamada devolve a próxima resposta da lista, em pedaços"""
+    
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+    
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        return iter([Chunk(text) for text in self.responses.pop(0)])
+
+# A primeira tarefa fecha antes de o JSON quebrar
+MALFORMED = ['{"tasks": ["Comprar pão", ', '"Pagar a con']
+VALID = ['{"tasks": ["Comprar pão", ', '"Pagar a conta"]}']
+
+@pytest.fixture(autouse=True)
+def retryable(monkeypatch):
+    # Sem o cliente do Google instalado: nenhum erro de cota nos testes, só respostas malformadas (ValueError)
+    monkeypatch.setattr(llm_processor, "retryable_errors", lambda: ())
+
+def make_processor(model) -> TaskProcessor:
+    return TaskProcessor(model=model, cache=LLMCache(), local_threshold=float("inf"), structured=True, backoff_base=0)
+
+def test_extract_tasks_retries_malformed_stream_after_first_item():
+    model = StreamingModel(MALFORMED, VALID)
+    assert make_processor(model).extract_tasks("mensagem") == ["Comprar pão", "Pagar a conta"]
+    assert model.calls == 2
+
+def test_extract_tasks_raises_after_last_attempt():
+    model = StreamingModel(*[MALFORMED] * 4)
+    with pytest.raises(ValueError):
+        make_processor(model).extract_tasks("mensagem")
+    assert model.calls == 4
+
+def test_stream_tasks_does_not_retry_after_delivering():
+    model = StreamingModel(MALFORMED, VALID)
+    stream = make_processor(model).stream_tasks("mensagem")
+    assert next(stream) == "Comprar pão"
+    with pytest.raises(ValueError):
+        next(stream)
+    assert model.calls == 1
+
+def test_stream_tasks_retries_before_delivering():
+    model = StreamingModel(['{"tasks": ["Compr'], VALID)
+    assert list(make_processor(model).stream_tasks("mensagem")) == ["Comprar pão", "Pagar a conta"]
+    assert model.calls == 2
@@ -0,0 +1,30 @@
+"""Regressão do extrator local contra o corpus rotulado de benchmarks/extraction_corpus.jsonl"""
+import pytest
+
+from bench_extractor import DEFAULT_CORPUS, load_corpus, same_tasks
+from local_extractor import extract_tasks_locally
+
+THRESHOLD = 0.8
+CORPUS = load_corpus(DEFAULT_CORPUS)
+
+def shortcut_results():
+    """(caso, tarefas) das mensagens que o atalho local resolve sem o modelo"""
+    results = []
+    for case in CORPUS:
+        tasks, confidence = extract_tasks_locally(case["message"])
+        if confidence >= THRESHOLD:
+            results.append((case, tasks))
+    return results
+
+def test_shortcut_precision():
+    wrong = [(case["message"], tasks) for case, tasks in shortcut_results() if not same_tasks(tasks, case["tasks"])]
+    assert wrong == []
+
+def test_shortcut_coverage():
+    # Parcela do corpus que dispensa o Gemini; cair daqui significa mais chamadas ao modelo
+    assert len(shortcut_results()) / len(CORPUS) >= 0.7
+
+@pytest.mark.parametrize("message", ["oi", "ok", "obrigado", ""])
+def test_messages_without_tasks_skip_the_model(message):
+    tasks, confidence = extract_tasks_locally(message)
+    assert tasks == [] and confidence >= THRESHOLD